@@ -6,8 +6,10 @@ import re
 from avefi_schema import model_pydantic_v2 as efi
 from xsdata.formats.dataclass.parsers import XmlParser
 
+from ..core import diagnostics
+from ..core.dates import is_valid_date
 from ..core.settings import settings
-from ..core.utils import described_by_issuer
+from ..core.utils import described_by_issuer, open_file
 from .generated.ntm_4_avefi import ntm_4_av_efi as ntm
 from .generated.ntm_4_avefi import ntm_4_av_efi_schema as ntm_main
 
@@ -26,7 +28,8 @@ def efi_import(input_file) -> list[efi.MovingImageRecord]:
 
 
 def read_input(input_file) -> ROOT_CLASS:
-    return parser.parse(input_file, ROOT_CLASS)
+    with open_file(input_file) as f:
+        return parser.parse(f, ROOT_CLASS)
 
 
 def map_to_efi(input: ROOT_CLASS) -> list[efi.MovingImageRecord]:
@@ -50,13 +53,18 @@ def map_to_efi(input: ROOT_CLASS) -> list[efi.MovingImageRecord]:
             and input.iwf_production_year
             and input.production_year not in input.iwf_production_year
         ):
-            log.warning(
-                f"Contradicting values:"
-                f" productionYear={input.production_year},"
-                f" iwfProductionYear={input.iwf_production_year}"
+            diagnostics.warning(
+                log,
+                "contradicting_production_years",
+                "Contradicting values: productionYear={},"
+                " iwfProductionYear={}",
+                input.production_year,
+                input.iwf_production_year,
             )
     else:
-        log.warning("No production year")
+        diagnostics.warning(
+            log, "no_production_year", "No production year in {}", source_key
+        )
     event = efi.ProductionEvent(has_date=production_year)
     work.has_event.append(event)
 
@@ -320,29 +328,20 @@ def get_iso_date(year: str, iwf_year: str) -> str | None:
             continue
         if "-" in iso_date:
             iso_date = iso_date.replace("-", "/")
-        if is_iso_date(iso_date):
+        if is_valid_date(iso_date):
             break
     else:
         if year or iwf_year:
-            log.warning(
-                f"Expected date or interval according to ISO 8601,"
-                f" got: {year or iwf_year}"
+            diagnostics.warning(
+                log,
+                "invalid_production_year",
+                "Expected date or interval according to ISO 8601, got: {}",
+                year or iwf_year,
             )
         return None
     return iso_date
 
 
-def is_iso_date(date_str):
-    return bool(
-        re.search(
-            r"^-?([1-9][0-9]{3,}|0[0-9]{3})(-(0[1-9]|1[0-2])"
-            "(-(0[1-9]|[12][0-9]|3[01]))?)?[?~]?(/-?([1-9][0-9]{3,}|0[0-9]{3})"
-            "(-(0[1-9]|1[0-2])(-(0[1-9]|[12][0-9]|3[01]))?)?[?~]?)?$",
-            date_str,
-        )
-    )
-
-
 CORPORATE_BODY_FLAG_WORDS = [
     " ag ",
     " ag, ",
@@ -425,12 +424,23 @@ def agent_from_name(
         name_components = name.split(",")
         if len(name_components) == 1:
             if len(name.split()) > 4:
-                log.warning(f"Left unusual name unchanged: {name}")
+                diagnostics.warning(
+                    log,
+                    "unusual_agent_name",
+                    "Left unusual name unchanged: {}",
+                    name,
+                )
             else:
                 name_components = name.rsplit(maxsplit=1)
                 orig_name = name
                 name = ", ".join(reversed(name_components))
-                log.info(f"Replaced name '{orig_name}' by '{name}'")
+                diagnostics.info(
+                    log,
+                    "replaced_agent_name",
+                    "Replaced name '{}' by '{}'",
+                    orig_name,
+                    name,
+                )
         elif len(name_components) != 2:
             raise ValueError(
                 f"Name probably not in correct format"
@@ -539,9 +549,11 @@ def make_title(input_title, title_type: efi.TitleTypeEnum) -> efi.Title:
     ):
         first, rest = split_title
         result.has_ordering_name = f"{rest}, {first}"
-        log.warning(
-            f"Pushing article to back of ordering name for title:"
-            f" {result.has_ordering_name}"
+        diagnostics.warning(
+            log,
+            "article_pushed_to_back",
+            "Pushing article to back of ordering name for title: {}",
+            result.has_ordering_name,
         )
     if len(display_title) > settings.line_limit:
         result.has_name = f"{display_title[: settings.line_limit - 3]}..."
@@ -549,9 +561,12 @@ def make_title(input_title, title_type: efi.TitleTypeEnum) -> efi.Title:
             result.has_ordering_name = result.has_ordering_name[
                 : settings.line_limit
             ]
-        log.warning(
-            f"Shortening title that exceeded line limit of"
-            f" {settings.line_limit} characters: {result.has_name}"
+        diagnostics.warning(
+            log,
+            "shortened_title",
+            "Shortening title that exceeded line limit of {} characters: {}",
+            settings.line_limit,
+            result.has_name,
         )
     return result
 
@@ -1,36 +1,591 @@
+from collections.abc import Callable, Container, Iterable, Iterator
+import hashlib
+from itertools import islice
+import json
+import os
 import pathlib
+import re
+import shutil
+import sys
+import tempfile
+from typing import NamedTuple
 
 from avefi_schema import model_pydantic_v2 as efi
-from pydantic import ValidationError
+
+from .utils import file_digest, open_file, strip_compression_suffix
+
+CHUNK_SIZE = 1 << 20
+# File name suffixes indicating JSON Lines, i.e. one record per line
+JSONL_SUFFIXES = (".jsonl", ".ndjson")
+# Either a (possibly unterminated) JSON string or a structural
+# character. Matching strings as a whole makes sure that brackets
+# within them are never taken for structure.
+_TOKEN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*(")?|[\[\]{}]')
+_SIGNIFICANT = re.compile(r"\S")
+_SIGNIFICANT_BYTE = re.compile(rb"\S")
+
+
+def is_jsonl(path: pathlib.Path | str) -> bool:
+    """Return True if the file name suggests JSON Lines format."""
+    return strip_compression_suffix(path).suffix.lower() in JSONL_SUFFIXES
 
 
 def load(source: pathlib.Path | str) -> list[efi.MovingImageRecord]:
-    """Load AVefi records from file."""
-    with pathlib.Path(source).open() as f:
+    """Load AVefi records from file (JSON or JSON Lines).
+
+    The file is read as bytes and handed over to the JSON parser of
+    pydantic-core without decoding it into a str first. Compressed
+    files are decompressed on the fly, see :func:`utils.open_file`.
+
+    """
+    with open_file(source) as f:
         input = f.read()
     return loads(input)
 
 
-def loads(input: str) -> list[efi.MovingImageRecord]:
-    """Load AVefi records from JSON string."""
+def loads(input: str | bytes) -> list[efi.MovingImageRecord]:
+    """Load AVefi records from JSON (or JSON Lines) string or bytes.
+
+    Look at the first significant character to tell the container
+    format. An array of records is validated as a whole, whereas a
+    single record or JSON Lines input are split into records by
+    :func:`iter_raw_records`. Either way, the input is parsed only
+    once.
+
+    """
+    if isinstance(input, str):
+        first = _SIGNIFICANT.search(input)
+        is_array = first is not None and first.group() == "["
+    else:
+        first = _SIGNIFICANT_BYTE.search(input)
+        is_array = first is not None and first.group() == b"["
+    if is_array:
+        return efi.MovingImageRecords.model_validate_json(input).root
+    return list(iter_loads(input))
+
+
+def iter_load(source: pathlib.Path | str) -> Iterator[efi.MovingImageRecord]:
+    """Iterate over AVefi records in file.
+
+    Unlike :func:`load`, the file is read in chunks and records are
+    validated one at a time as soon as they have been read
+    completely. Thus, memory usage is bounded by the size of the
+    largest record rather than the size of the file.
+
+    """
+    with open_file(source) as f:
+        yield from _validate_each(iter_raw_records(f.read))
+
+
+def iter_loads(input: str | bytes) -> Iterator[efi.MovingImageRecord]:
+    """Iterate over AVefi records in JSON string."""
+    if isinstance(input, str):
+        input = input.encode()
+    chunks = iter((input,))
+    yield from _validate_each(iter_raw_records(lambda _: next(chunks, b"")))
+
+
+def _validate_each(raw_records: Iterator[bytes]):
+    for raw_record in raw_records:
+        yield efi.MovingImageRecordTypeAdapter.validate_json(raw_record)
+
+
+class DecodedRecords(NamedTuple):
+    """Records as returned by :func:`load_decoded`, in the same order.
+
+    Attributes
+    ----------
+    instances : list[dict]
+        Decoded JSON of the records. Records loaded from the record
+        cache come with a sequence decoding them on access instead,
+        see cache.load_decoded().
+    records : list[efi.MovingImageRecord]
+        Models built from ``instances``.
+    digests : list[bytes]
+        Digest of the serialised records as found in the input.
+
+    """
+
+    instances: list[dict]
+    records: list[efi.MovingImageRecord]
+    digests: list[bytes]
+
+
+def iter_decode(source: pathlib.Path | str) -> Iterator[dict]:
+    """Iterate over records in file as decoded JSON.
+
+    Like :func:`iter_load` but records are merely decoded, i.e. they
+    are plain dicts as found in the file, which is what the JSON
+    schema applies to. See :func:`to_record` for turning them into
+    pydantic models.
+
+    """
+    with open_file(source) as f:
+        for raw_record in iter_raw_records(f.read):
+            yield json.loads(raw_record)
+
+
+def to_record(instance: dict) -> efi.MovingImageRecord:
+    """Validate decoded JSON of a record against the pydantic models."""
+    return efi.MovingImageRecordTypeAdapter.validate_python(instance)
+
+
+def record_digest(raw_record: bytes) -> bytes:
+    """Return digest identifying the content of a serialised record."""
+    return hashlib.blake2b(raw_record, digest_size=16).digest()
+
+
+def load_decoded(source: pathlib.Path | str) -> DecodedRecords:
+    """Load AVefi records from file along with their decoded JSON.
+
+    The input is parsed only once. Models are built from the decoded
+    JSON, so there is no need to dump them again for validation
+    against the JSON schema.
+
+    """
+    with open_file(source) as f:
+        return decode_records(iter_raw_records(f.read))
+
+
+def iter_load_decoded(
+    source: pathlib.Path | str, batch_size: int
+) -> Iterator[DecodedRecords]:
+    """Iterate over batches of records as returned by load_decoded().
+
+    Each batch holds up to ``batch_size`` records, which is all that
+    is kept in memory at a time.
+
+    """
+    with open_file(source) as f:
+        raw_records = iter_raw_records(f.read)
+        while batch := list(islice(raw_records, batch_size)):
+            yield decode_records(batch)
+
+
+def decode_records(raw_records: Iterable[bytes]) -> DecodedRecords:
+    """Decode serialised records as returned by iter_raw_records()."""
+    instances = []
+    digests = []
+    for raw_record in raw_records:
+        instances.append(json.loads(raw_record))
+        digests.append(record_digest(raw_record))
+    return DecodedRecords(
+        instances, [to_record(instance) for instance in instances], digests
+    )
+
+
+def iter_raw_records(
+    read: Callable[[int], bytes], chunk_size: int = CHUNK_SIZE
+) -> Iterator[bytes]:
+    """Split JSON input into the serialised records it contains.
+
+    See :func:`iter_raw_spans` for details.
+
+    """
+    for _, raw_record in iter_raw_spans(read, chunk_size):
+        yield raw_record
+
+
+def iter_raw_spans(
+    read: Callable[[int], bytes], chunk_size: int = CHUNK_SIZE
+) -> Iterator[tuple[int, bytes]]:
+    """Split JSON input into records and tell where they are located.
+
+    Tokenize the input returned by successive calls to ``read`` just
+    enough to find the boundaries of JSON objects and yield each of
+    them as bytes along with its offset from the start of input.
+    Input may either be a single record, a single array of records or
+    a sequence of records (e.g. one per line), but not a mix thereof.
+
+    Parameters
+    ----------
+    read : Callable[[int], bytes]
+        Function returning up to the requested number of bytes and
+        an empty bytes object at the end of input, e.g. the read
+        method of a file opened in binary mode.
+    chunk_size : int
+        Number of bytes requested from ``read`` at a time.
+
+    Raises
+    ------
+    ValueError
+        When anything but whitespace and separating commas is found
+        between records or the input ends in the middle of a record.
+
+    """
+    buf = b""
+    base = 0  # offset of buf in the input
+    pos = 0  # where to continue scanning
+    consumed = 0  # end of the last record or gap that has been checked
+    start = None  # start of the current record
+    depth = 0
+    in_array = False
+    closed = False  # whether the top-level array has been closed
+    count = 0  # number of records in the array or the sequence
+    eof = False
+    while True:
+        for m in _TOKEN.finditer(buf, pos):
+            token = m.group()
+            if token[0] == 34:  # '"'
+                if m.group(1) is None:
+                    # String continues in the next chunk
+                    break
+                if start is None:
+                    _unexpected(buf[consumed : m.end()])
+            elif token in b"{[":
+                if start is None:
+                    if closed:
+                        # Only whitespace may follow the array
+                        _unexpected(buf[consumed : m.end()])
+                    elif token == b"{":
+                        separator = b"," if in_array and count else b""
+                        _check_gap(buf[consumed : m.start()], separator)
+                        start = m.start()
+                    elif not in_array and not count:
+                        _check_gap(buf[consumed : m.start()])
+                        in_array = True
+                        count = 0
+                        consumed = m.end()
+                    else:
+                        _unexpected(token)
+                depth += 1
+            else:
+                depth -= 1
+                if start is not None:
+                    if depth == in_array:
+                        yield base + start, buf[start : m.end()]
+                        start = None
+                        count += 1
+                        consumed = m.end()
+                elif in_array and token == b"]":
+                    _check_gap(buf[consumed : m.start()])
+                    in_array = False
+                    closed = True
+                    consumed = m.end()
+                else:
+                    _unexpected(token)
+            pos = m.end()
+        else:
+            pos = len(buf)
+        if eof:
+            break
+        # Discard whatever has been dealt with before reading on
+        keep = consumed if start is None else start
+        buf = buf[keep:]
+        base += keep
+        pos -= keep
+        consumed -= keep
+        if start is not None:
+            start -= keep
+        chunk = read(chunk_size)
+        if chunk:
+            buf += chunk
+        else:
+            eof = True
+    if in_array or start is not None:
+        raise ValueError("Unexpected end of input")
+    _check_gap(buf[consumed:])
+
+
+def _check_gap(gap: bytes, separator: bytes = b""):
+    if gap.strip() != separator:
+        _unexpected(gap)
+
+
+def _unexpected(data: bytes):
+    raise ValueError(f"Unexpected data in input: {data.strip()[:50]!r}")
+
+
+def filter_file(source: pathlib.Path | str, keep: Container[int]):
+    """Remove records from file in place, leaving the others untouched.
+
+    Copy the records whose position in ``source`` is contained in
+    ``keep`` byte by byte to a temporary file and replace ``source``
+    with it. Whatever precedes the first record, succeeds the last
+    one or separates records (e.g. brackets, commas and indentation)
+    is carried over as well, so that the output differs from the
+    input only where records have been removed. Compression is
+    preserved according to the file name suffix.
+
+    Parameters
+    ----------
+    source : pathlib.Path | str
+        AVefi file in any format supported by :func:`iter_load`.
+    keep : Container[int]
+        Zero-based positions of the records to be kept.
+
+    """
+    source = pathlib.Path(source)
+    with open_file(source) as f:
+        spans = [
+            (offset, offset + len(raw_record))
+            for offset, raw_record in iter_raw_spans(f.read)
+        ]
+    fd, tmp_name = tempfile.mkstemp(
+        dir=source.parent, prefix=f".{source.name}.", suffix=source.suffix
+    )
+    os.close(fd)
     try:
-        container = efi.MovingImageRecords.model_validate_json(input)
-        return container.root
-    except ValidationError as e:
-        err0 = e.errors()[0]
-        if err0.get("loc") == () and err0.get("type") == "list_type":
-            record = efi.MovingImageRecordTypeAdapter.validate_json(input)
-            return [record]
+        shutil.copymode(source, tmp_name)
+        with open_file(source) as f_in, open_file(tmp_name, "wb") as f_out:
+
+            def copy(start, end, write=True):
+                # Copy (or skip) input up to ``end``, starting at
+                # ``start`` which is supposed to be the current position
+                remaining = end - start
+                while remaining > 0:
+                    chunk = f_in.read(min(remaining, CHUNK_SIZE))
+                    if not chunk:
+                        raise ValueError(f"{source} changed while filtering")
+                    if write:
+                        f_out.write(chunk)
+                    remaining -= len(chunk)
+
+            if spans and not any(i in keep for i in range(len(spans))):
+                # Leave an empty array (if any) rather than the
+                # indentation of records that are gone
+                f_out.write(f_in.read(spans[0][0]).rstrip())
+                copy(spans[0][0], spans[-1][1], write=False)
+                f_out.write(f_in.read().lstrip())
+            else:
+                pos = 0
+                kept_any = False
+                for i, (start, end) in enumerate(spans):
+                    # Everything up to the first record goes in any
+                    # case, separators only in between records kept
+                    write = i == 0 or (kept_any and i in keep)
+                    copy(pos, start, write=write)
+                    copy(start, end, write=i in keep)
+                    kept_any = kept_any or i in keep
+                    pos = end
+                shutil.copyfileobj(f_in, f_out, CHUNK_SIZE)
+        os.replace(tmp_name, source)
+    except BaseException:
+        os.unlink(tmp_name)
         raise
 
 
-def dump(records: list[efi.MovingImageRecord], to_file: str):
-    """Dump AVefi records to JSON file."""
-    with open(to_file, "w") as f:
-        f.write(dumps(records, indent=2))
+def dump(records: list[efi.MovingImageRecord], to_file: str, jsonl=None):
+    """Dump AVefi records to JSON (or JSON Lines) file."""
+    with AvefiWriter(to_file, jsonl=jsonl) as writer:
+        writer.write_all(records)
 
 
-def dumps(records: list[efi.MovingImageRecord], indent=None) -> str:
-    """Dump AVefi records to string (in JSON format)."""
+def dumps(
+    records: list[efi.MovingImageRecord], indent=None, jsonl=False
+) -> str:
+    """Dump AVefi records to string (in JSON or JSON Lines format)."""
+    if jsonl:
+        return "".join(
+            efi.MovingImageRecordTypeAdapter.dump_json(
+                record, exclude_none=True
+            ).decode()
+            + "\n"
+            for record in records
+        )
     container = efi.MovingImageRecords(records)
     return container.model_dump_json(exclude_none=True, indent=indent)
+
+
+class AvefiWriter:
+    """Write AVefi records to a JSON file one at a time.
+
+    Records are serialised and written as soon as they are passed to
+    :meth:`write`, so memory usage does not grow with the number of
+    records. The output is the same as that of :func:`dump`, provided
+    that the writer is used as a context manager and the block is
+    left without an exception. Otherwise, the JSON array is not
+    terminated, leaving an obviously incomplete file behind.
+
+    In JSON Lines format, each record is written on a line of its own
+    without any enclosing array, making the output suitable for
+    appending to or splitting at arbitrary line boundaries.
+
+    Output is compressed on the fly if the suffix of ``to_file``
+    indicates a supported compression format (.gz, .xz or .bz2).
+
+    Parameters
+    ----------
+    to_file : pathlib.Path | str | None
+        Output file or None for stdout.
+    indent : int | None
+        Indentation of the JSON output (ignored for JSON Lines).
+    jsonl : bool | None
+        Write JSON Lines rather than a JSON array. If None, decide
+        based on the suffix of ``to_file``.
+
+    Examples
+    --------
+    >>> with AvefiWriter("efi_records.json") as writer:
+    ...     for record in records:
+    ...         writer.write(record)
+
+    """
+
+    def __init__(
+        self,
+        to_file: pathlib.Path | str | None = None,
+        indent: int | None = 2,
+        jsonl: bool | None = None,
+    ):
+        if jsonl is None:
+            jsonl = to_file is not None and is_jsonl(to_file)
+        self.to_file = to_file
+        self.indent = None if jsonl else indent
+        self.jsonl = jsonl
+        self.count = 0
+        # Number of (uncompressed) bytes written so far
+        self.size = 0
+        self._file = None
+
+    def __enter__(self):
+        """Open output file and start the JSON array."""
+        if self.to_file is None:
+            sys.stdout.flush()
+            self._file = sys.stdout.buffer
+        else:
+            self._file = open_file(self.to_file, "wb")
+        if not self.jsonl:
+            self._write(b"[")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Terminate the JSON array and close output file."""
+        try:
+            if exc_type is None and not self.jsonl:
+                self._write(b"\n]" if self.indent and self.count else b"]")
+                if self.to_file is None:
+                    self._write(b"\n")
+        finally:
+            if self.to_file is None:
+                self._file.flush()
+            else:
+                self._file.close()
+            self._file = None
+
+    def write(self, record: efi.MovingImageRecord):
+        """Serialise record and append it to the output."""
+        data = efi.MovingImageRecordTypeAdapter.dump_json(
+            record, exclude_none=True, indent=self.indent
+        )
+        if self.jsonl:
+            self._write(data)
+            self._write(b"\n")
+        else:
+            if self.indent:
+                padding = b" " * self.indent
+                data = padding + data.replace(b"\n", b"\n" + padding)
+                separator = b",\n" if self.count else b"\n"
+            else:
+                separator = b"," if self.count else b""
+            self._write(separator)
+            self._write(data)
+        self.count += 1
+
+    def write_all(self, records: Iterable[efi.MovingImageRecord]):
+        """Serialise records and append them to the output."""
+        for record in records:
+            self.write(record)
+
+    def _write(self, data: bytes):
+        self._file.write(data)
+        self.size += len(data)
+
+
+class ShardedWriter:
+    """Write AVefi records to a series of files of limited size.
+
+    Shards are named after ``to_file`` with a running number appended
+    to the stem, e.g. ``out-00000.json``, ``out-00001.json``, and so
+    on. A shard is closed as soon as it has reached ``shard_size``
+    records or (uncompressed) bytes, respectively. Upon leaving the
+    context without an exception, a manifest listing all shards with
+    their record counts and SHA-256 checksums is written to
+    ``out.manifest.json``.
+
+    Parameters
+    ----------
+    to_file : pathlib.Path | str
+        Output file name the shard names are derived from.
+    shard_size : int
+        Maximum number of records or bytes per shard.
+    unit : str
+        Either "records" or "bytes".
+    **kwargs
+        Further arguments passed on to :class:`AvefiWriter`.
+
+    """
+
+    def __init__(
+        self,
+        to_file: pathlib.Path | str,
+        shard_size: int,
+        unit: str = "records",
+        **kwargs,
+    ):
+        if unit not in ("records", "bytes"):
+            raise ValueError(f"Unknown unit for shard size: {unit}")
+        if shard_size < 1:
+            raise ValueError(f"Shard size must be positive: {shard_size}")
+        to_file = pathlib.Path(to_file)
+        base = strip_compression_suffix(to_file)
+        self._name_template = (
+            f"{base.stem}-{{:05d}}{base.suffix}"
+            f"{to_file.suffix if base != to_file else ''}"
+        )
+        self.directory = to_file.parent
+        self.manifest_file = self.directory / f"{base.stem}.manifest.json"
+        self.shard_size = shard_size
+        self.unit = unit
+        self.writer_args = kwargs
+        self.count = 0
+        self.shards = []
+        self._writer = None
+
+    def __enter__(self):
+        """Return self, shards are opened on demand."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close current shard and write manifest."""
+        if self._writer is not None:
+            self._close_shard(exc_type, exc_value, traceback)
+        if exc_type is None:
+            manifest = {"records": self.count, "shards": self.shards}
+            with self.manifest_file.open("w") as f:
+                json.dump(manifest, f, indent=2)
+                f.write("\n")
+
+    def write(self, record: efi.MovingImageRecord):
+        """Append record to the current shard, starting one if need be."""
+        if self._writer is None:
+            shard_file = self.directory / self._name_template.format(
+                len(self.shards)
+            )
+            self._writer = AvefiWriter(shard_file, **self.writer_args)
+            self._writer.__enter__()
+        self._writer.write(record)
+        self.count += 1
+        if self.unit == "records":
+            filled = self._writer.count
+        else:
+            filled = self._writer.size
+        if filled >= self.shard_size:
+            self._close_shard(None, None, None)
+
+    def write_all(self, records: Iterable[efi.MovingImageRecord]):
+        """Append records to the output, starting new shards as needed."""
+        for record in records:
+            self.write(record)
+
+    def _close_shard(self, exc_type, exc_value, traceback):
+        writer = self._writer
+        self._writer = None
+        writer.__exit__(exc_type, exc_value, traceback)
+        self.shards.append(
+            {
+                "file": pathlib.Path(writer.to_file).name,
+                "records": writer.count,
+                "sha256": file_digest(writer.to_file),
+            }
+        )
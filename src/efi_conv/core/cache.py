@@ -0,0 +1,329 @@
+from collections.abc import Iterable, Sequence
+import hashlib
+from importlib import metadata
+import inspect
+import io
+import json
+import logging
+import os
+import pathlib
+import pickle
+import sqlite3
+import tempfile
+import time
+
+import appdirs
+from avefi_schema import model_pydantic_v2 as efi
+
+from . import avefi, rules
+from .settings import settings
+from .utils import file_digest, open_file
+
+log = logging.getLogger(__name__)
+# Entries are trusted like the packages installed for the user, i.e.
+# unpickled or executed as found. Checks along the way merely detect
+# corrupt entries: whoever can write to CACHE_DIR can forge them.
+CACHE_DIR = pathlib.Path(
+    appdirs.user_cache_dir(appname=__name__.split(".")[0])
+)
+RECORD_CACHE_DIR = CACHE_DIR / "records"
+# Bump whenever the content of record cache entries changes
+RECORD_CACHE_FORMAT = "4"
+RESULT_CACHE_FILE = CACHE_DIR / "results.sqlite"
+# Seconds after which temporary files in cache directories are taken
+# for leftovers of crashed processes rather than files being written
+STALE_TMP_AGE = 3600
+# Number of digests looked up in the result cache per query
+RESULT_CACHE_BATCH_SIZE = 500
+# Seconds after which entries of the result cache for a setup that has
+# not been used since are dropped
+RESULT_CACHE_MAX_AGE = 30 * 24 * 3600
+# Settings the results of the rules depend on
+RULE_SETTINGS = {"line_limit", "text_limit"}
+
+
+def package_version(name: str) -> str:
+    """Return version of package ``name``, "unknown" if not installed.
+
+    The latter is the case when running from a source checkout
+    without installing efi_conv.
+
+    """
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def load_records(
+    source: pathlib.Path | str, schema_version: str
+) -> list[efi.MovingImageRecord]:
+    """Load AVefi records from file, using the record cache if possible.
+
+    The record cache holds pickled lists of records that have already
+    been validated against the pydantic models. A cache entry is only
+    used if the content of ``source``, ``schema_version``, the source
+    of the avefi_schema models and the versions of pydantic,
+    pydantic_core and efi_conv match, in which case JSON parsing and
+    model validation are skipped entirely. Otherwise, or if the entry
+    cannot be unpickled for any reason, records are loaded from
+    ``source`` and stored in the cache.
+
+    Parameters
+    ----------
+    source : pathlib.Path | str
+        AVefi file in any format supported by :func:`avefi.iter_load`.
+    schema_version : str
+        Identifies the JSON schema the records will be checked
+        against, e.g. the digest of the schema file.
+
+    """
+    return load_decoded(source, schema_version).records
+
+
+def load_decoded(
+    source: pathlib.Path | str, schema_version: str
+) -> avefi.DecodedRecords:
+    """Load records along with their decoded JSON, see load_records().
+
+    Returns the same as :func:`avefi.load_decoded`. Rather than the
+    decoded JSON, the cache entry only holds the position of each
+    record in ``source``, which is decoded from there on access.
+
+    """
+    with open_file(source) as f:
+        data = f.read()
+    key = hashlib.sha256(
+        "\0".join(
+            (
+                hashlib.sha256(data).hexdigest(),
+                schema_version,
+                file_digest(efi.__file__),
+                package_version("pydantic"),
+                package_version("pydantic_core"),
+                package_version("efi_conv"),
+                RECORD_CACHE_FORMAT,
+            )
+        ).encode()
+    ).hexdigest()
+    cache_file = RECORD_CACHE_DIR / f"{key}.pickle"
+    try:
+        with cache_file.open("rb") as f:
+            records, digests, spans = pickle.load(f)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # Unpickling fails in all sorts of ways if the models have
+        # changed in a way the key does not reflect
+        log.warning(f"Ignoring unusable cache file {cache_file}: {e}")
+    else:
+        log.debug(f"Loaded {source} from cache")
+        # Keep track of usage for eviction
+        os.utime(cache_file)
+        return avefi.DecodedRecords(
+            _DecodedOnAccess(data, spans), records, digests
+        )
+
+    spans = [
+        (offset, offset + len(raw_record))
+        for offset, raw_record in avefi.iter_raw_spans(io.BytesIO(data).read)
+    ]
+    decoded = avefi.decode_records(data[start:end] for start, end in spans)
+    RECORD_CACHE_DIR.mkdir(exist_ok=True, parents=True)
+    fd, tmp_name = tempfile.mkstemp(dir=RECORD_CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(
+                (decoded.records, decoded.digests, spans),
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp_name, cache_file)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+    evict(RECORD_CACHE_DIR, settings.record_cache_size)
+    return decoded
+
+
+class _DecodedOnAccess(Sequence):
+    """Decoded JSON of records, decoded from their source on access."""
+
+    def __init__(self, data: bytes, spans: list[tuple[int, int]]):
+        self.data = data
+        self.spans = spans
+
+    def __len__(self):
+        """Return number of records."""
+        return len(self.spans)
+
+    def __getitem__(self, pos):
+        """Return record at ``pos`` decoded from its source."""
+        if isinstance(pos, slice):
+            return [self._decode(span) for span in self.spans[pos]]
+        return self._decode(self.spans[pos])
+
+    def _decode(self, span):
+        start, end = span
+        return json.loads(self.data[start:end])
+
+
+def evict(cache_dir: pathlib.Path, max_size: int):
+    """Remove least recently used files until ``max_size`` is met.
+
+    Temporary files are left alone while they may still be written by
+    other processes and removed once older than STALE_TMP_AGE seconds.
+
+    """
+    entries = []
+    now = time.time()
+    for path in cache_dir.iterdir():
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        if path.suffix == ".tmp":
+            if now - stat.st_mtime > STALE_TMP_AGE:
+                log.debug(f"Removing stale temporary file {path}")
+                path.unlink(missing_ok=True)
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= max_size:
+            break
+        log.debug(f"Evicting {path} from cache")
+        path.unlink(missing_ok=True)
+        total_size -= size
+
+
+class ResultCache:
+    """Results of checking records, looked up by record content.
+
+    Keep the rule violations found in records that have passed
+    validation against the JSON schema in an SQLite database, keyed by
+    the digest of the serialised record (see avefi.record_digest()).
+    Entries are only valid for the same ``schema_version``, settings
+    in RULE_SETTINGS, rules (as identified by their names and the
+    source of the modules defining them), source of the avefi_schema
+    models and versions of pydantic, pydantic_core and efi_conv.
+    Entries for other setups are kept, so that runs with different
+    settings or schemas do not spoil each other's entries. Setups not
+    used within RESULT_CACHE_MAX_AGE seconds are dropped along with
+    their entries when the cache is opened, see prune().
+
+    Parameters
+    ----------
+    schema_version : str
+        Identifies the JSON schema records are checked against, e.g.
+        the digest of the schema file.
+
+    """
+
+    def __init__(self, schema_version: str):
+        registered = rules.registered_rules()
+        # Rules may change without a version being bumped, so do the
+        # models they apply to
+        sources = {inspect.getsourcefile(r.check) for r in registered}
+        sources.add(efi.__file__)
+        self.version = hashlib.sha256(
+            "\0".join(
+                (
+                    schema_version,
+                    settings.model_dump_json(include=RULE_SETTINGS),
+                    *(file_digest(source) for source in sorted(sources)),
+                    package_version("pydantic"),
+                    package_version("pydantic_core"),
+                    package_version("efi_conv"),
+                    *(r.name for r in registered),
+                )
+            ).encode()
+        ).hexdigest()
+        RESULT_CACHE_FILE.parent.mkdir(exist_ok=True, parents=True)
+        self._db = sqlite3.connect(RESULT_CACHE_FILE)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results (version TEXT,"
+                " digest BLOB, violations TEXT,"
+                " PRIMARY KEY (version, digest)) WITHOUT ROWID"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS versions"
+                " (version TEXT PRIMARY KEY, used REAL)"
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO versions VALUES (?, ?)",
+                (self.version, time.time()),
+            )
+        self.prune(RESULT_CACHE_MAX_AGE)
+
+    def __enter__(self):
+        """Return self."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the database."""
+        self.close()
+
+    def close(self):
+        """Close the database."""
+        self._db.close()
+
+    def prune(self, max_age: float = 0):
+        """Drop entries of setups not used within ``max_age`` seconds.
+
+        Entries of the current setup are always kept.
+
+        """
+        with self._db:
+            self._db.execute(
+                "DELETE FROM versions WHERE used < ? AND version != ?",
+                (time.time() - max_age, self.version),
+            )
+            self._db.execute(
+                "DELETE FROM results"
+                " WHERE version NOT IN (SELECT version FROM versions)"
+            )
+
+    def get(self, digests: list[bytes]) -> list[list | None]:
+        """Look up results of records by digest.
+
+        Returns
+        -------
+        list[list[rules.Violation] | None]
+            Violations for every digest in ``digests``, in the same
+            order, or None if the record has not been checked yet.
+
+        """
+        found = {}
+        for start in range(0, len(digests), RESULT_CACHE_BATCH_SIZE):
+            batch = digests[start : start + RESULT_CACHE_BATCH_SIZE]
+            found.update(
+                self._db.execute(
+                    f"SELECT digest, violations FROM results"
+                    f" WHERE version = ?"
+                    f" AND digest IN ({', '.join('?' * len(batch))})",
+                    (self.version, *batch),
+                )
+            )
+        results = []
+        for digest in digests:
+            violations = found.get(digest)
+            if violations is not None:
+                violations = [
+                    rules.Violation(*violation)
+                    for violation in json.loads(violations)
+                ]
+            results.append(violations)
+        return results
+
+    def put(self, results: Iterable[tuple[bytes, list]]):
+        """Store violations found in records by digest."""
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                (
+                    (self.version, digest, json.dumps(violations))
+                    for digest, violations in results
+                ),
+            )
@@ -1,28 +1,44 @@
-from collections import defaultdict
+from array import array
+from bisect import bisect_right
+from collections import deque
+from collections.abc import Callable, Container, Iterable, Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor
+import contextlib
 from datetime import datetime
+import functools
+from itertools import islice
 import json
 import logging
-import pathlib
-import re
+import multiprocessing.util
 import sys
 
-import appdirs
 from avefi_schema import model_pydantic_v2 as efi
 import click
 from jsonschema.exceptions import best_match
-from jsonschema.validators import validator_for
 import requests
 
-from . import avefi
+from . import avefi, cache, diagnostics, rules
+from .cache import CACHE_DIR
 from .cli import cli_main
-from .settings import settings
+from .profiling import NULL_PROFILE, Profile
+from .utils import file_digest
+from .validator import load_validator
 
 log = logging.getLogger(__name__)
 SCHEMA_SOURCE = "https://raw.githubusercontent.com/AV-EFI/av-efi-schema/main/project/jsonschema/avefi_schema/model.schema.json"
-CACHE_DIR = pathlib.Path(
-    appdirs.user_cache_dir(appname=__name__.split(".")[0])
-)
 SCHEMA_FILE = CACHE_DIR / "avefi_schema.json"
+# Number of records per task when validating in a process pool and
+# maximum number of tasks queued at a time
+VALIDATION_CHUNK_SIZE = 1000
+VALIDATION_MAX_PENDING = 32
+# Number of records per batch while checking a file, rounded up when
+# validating in a process pool, see check_batch_size()
+CHECK_BATCH_SIZE = 5000
+# Validator of the current worker process, see validation_pool()
+_worker_validator = None
+# Function checking a file in the current worker process, see
+# check_in_parallel()
+_worker_check_file = None
 
 
 @cli_main.command()
@@ -37,6 +53,49 @@ SCHEMA_FILE = CACHE_DIR / "avefi_schema.json"
     default=False,
     help="Remove invalid records modifying EFI_FILE in place.",
 )
+@click.option(
+    "--cache/--no-cache",
+    "use_cache",
+    default=False,
+    help="Keep validated records in a local cache to speed up"
+    " subsequent checks of the same files.",
+)
+@click.option(
+    "--incremental/--no-incremental",
+    default=False,
+    help="Remember the results for each record, so that only new or"
+    " changed records are validated in subsequent checks.",
+)
+@click.option(
+    "--global",
+    "global_",
+    is_flag=True,
+    default=False,
+    help="Resolve references across all EFI_FILES rather than within"
+    " each file.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of processes validating records against the schema.",
+)
+@click.option(
+    "--parallel-files",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of processes checking EFI_FILES concurrently, each"
+    " file on its own.",
+)
+@click.option(
+    "--profile",
+    "profile_format",
+    type=click.Choice(["text", "json"]),
+    default=None,
+    help="Print wall time, CPU time and throughput per phase of the"
+    " check as well as peak memory usage in the given format.",
+)
 @click.option(
     "--update-schema",
     "-u",
@@ -52,33 +111,458 @@ def check(
     *,
     preserve_status_removed=False,
     remove_invalid=False,
+    use_cache=False,
+    incremental=False,
+    global_=False,
+    jobs=1,
+    parallel_files=1,
+    profile_format=None,
     update_schema=False,
 ):
-    """Sanity check EFI_FILES and optionally remove invalid records."""
-    schema_validator = get_schema_validator(update_schema=update_schema)
-    for efi_file in efi_files:
-        log.info(f"Processing {efi_file}")
-        efi_records = avefi.load(efi_file)
-        old_count = len(efi_records)
-        if not pass_checks(efi_records, schema_validator, remove_invalid=True):
-            if remove_invalid:
-                avefi.dump(efi_records, efi_file)
-                log.info(
-                    f"Successfully removed {old_count - len(efi_records)}"
-                    f" invalid records"
+    """Sanity check EFI_FILES and optionally remove invalid records.
+
+    Files are checked one by one, unless --global is given. In that
+    case, references are resolved across all files, e.g. manifestations
+    in one file may belong to works in another. Only what is needed to
+    resolve references is kept in memory while going through the files.
+    With --parallel-files, several files are checked at the same time,
+    each on its own.
+
+    """
+    if parallel_files > 1 and (global_ or jobs > 1):
+        raise click.UsageError(
+            "--parallel-files cannot be combined with --global or --jobs"
+        )
+    profile = Profile(enabled=profile_format is not None)
+    with profile.phase("schema setup"):
+        schema_validator = get_schema_validator(update_schema=update_schema)
+    schema_version = None
+    if use_cache or incremental:
+        schema_version = file_digest(SCHEMA_FILE)
+    all_was_fine = True
+    if parallel_files > 1:
+        all_was_fine = check_in_parallel(
+            efi_files,
+            parallel_files,
+            schema_validator,
+            remove_invalid=remove_invalid,
+            schema_version=schema_version,
+            use_cache=use_cache,
+            incremental=incremental,
+            profile=profile,
+        )
+    else:
+        if jobs > 1:
+            pool = validation_pool(schema_validator, jobs)
+        else:
+            pool = contextlib.nullcontext()
+        if incremental:
+            result_cache = cache.ResultCache(schema_version)
+        else:
+            result_cache = contextlib.nullcontext()
+        with pool as executor, result_cache as result_cache:
+            check_file = functools.partial(
+                load_and_check,
+                schema_validator=schema_validator,
+                executor=executor,
+                schema_version=schema_version if use_cache else None,
+                result_cache=result_cache,
+                batch_size=check_batch_size(jobs),
+                profile=profile,
+            )
+            if global_:
+                all_was_fine = check_globally(
+                    efi_files,
+                    check_file,
+                    remove_invalid=remove_invalid,
+                    profile=profile,
                 )
             else:
-                log.error(
-                    f"Found {old_count - len(efi_records)} invalid records"
-                    f" (no action taken)"
-                )
-                sys.exit(1)
+                for efi_file in efi_files:
+                    all_was_fine = check_single_file(
+                        efi_file,
+                        check_file,
+                        remove_invalid=remove_invalid,
+                        profile=profile,
+                    )
+                    if not all_was_fine and not remove_invalid:
+                        break
+    log_rule_stats()
+    diagnostics.log_summary()
+    if profile_format == "json":
+        click.echo(json.dumps(profile.report(), indent=2))
+    elif profile_format == "text":
+        click.echo(profile.format())
+    if not all_was_fine and not remove_invalid:
+        sys.exit(1)
+
+
+def check_single_file(
+    efi_file,
+    check_file: Callable,
+    remove_invalid=False,
+    profile: Profile = NULL_PROFILE,
+) -> bool:
+    """Check file on its own, resolving references within the file.
+
+    ``check_file`` is called with the file and a new ReferenceGraph
+    and returns the same as load_and_check(). Invalid records are
+    removed or just reported, see remove_records().
+
+    Returns
+    -------
+    bool
+        True if all records have passed the checks.
+
+    """
+    graph = ReferenceGraph()
+    all_was_fine, count = check_file(efi_file, graph)
+    if not check_references(graph, remove_invalid=True, profile=profile):
+        all_was_fine = False
+    if not all_was_fine:
+        remove_records(
+            efi_file, count, graph.removed, remove_invalid, profile=profile
+        )
+    else:
+        log.info(f"All {count} records passed the checks successfully")
+    return all_was_fine
+
+
+def check_in_parallel(
+    efi_files,
+    processes: int,
+    schema_validator,
+    remove_invalid=False,
+    schema_version: str | None = None,
+    use_cache=False,
+    incremental=False,
+    profile: Profile = NULL_PROFILE,
+) -> bool:
+    """Check files on their own in a pool of ``processes`` processes.
+
+    Every worker process sets up its own instance of the class of
+    ``schema_validator`` once, taking the compiled code from the
+    validator cache, as well as its own connection to the result
+    cache if ``incremental`` is set. Workers log with the level and
+    format of the handler of this package's logger, even if they have
+    been spawned rather than forked. Files are then checked just like
+    by check_single_file(). Diagnostics, profiles and rule statistics
+    of the workers are merged into those of the current process in
+    the order of ``efi_files``. Unless ``remove_invalid`` is set,
+    files still pending are cancelled as soon as one has failed, just
+    like a sequential run stops at the first invalid file. Note that
+    files already being checked at that time are still checked to the
+    end, so their results are merged as well.
+
+    Returns
+    -------
+    bool
+        True if all files have passed the checks.
+
+    """
+    all_was_fine = True
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=_init_file_worker,
+        initargs=(
+            type(schema_validator),
+            schema_validator.schema,
+            schema_version if use_cache else None,
+            schema_version if incremental else None,
+            _log_setup(),
+        ),
+    ) as executor:
+        futures = [
+            executor.submit(
+                _check_file_in_worker,
+                efi_file,
+                remove_invalid,
+                profile.enabled,
+            )
+            for efi_file in efi_files
+        ]
+        try:
+            for future in futures:
+                if future.cancelled():
+                    continue
+                passed, collected, worker_profile, stats = future.result()
+                diagnostics.merge(collected)
+                profile.merge(worker_profile)
+                rules.merge_stats(stats)
+                if not passed and all_was_fine:
+                    all_was_fine = False
+                    if not remove_invalid:
+                        for pending in futures:
+                            pending.cancel()
+        finally:
+            for future in futures:
+                future.cancel()
+    return all_was_fine
+
+
+def _log_setup() -> tuple[int, str | None] | None:
+    """Return level and format of the handler of the package logger."""
+    package_log = logging.getLogger(__package__.partition(".")[0])
+    if not package_log.handlers:
+        return None
+    handler = package_log.handlers[0]
+    formatter = handler.formatter
+    return handler.level, None if formatter is None else formatter._fmt
+
+
+def _init_file_worker(
+    validator_cls, schema, record_cache, result_cache, log_setup
+):
+    global _worker_check_file
+    package_log = logging.getLogger(__package__.partition(".")[0])
+    # Spawned rather than forked, i.e. logging has not been set up
+    if log_setup is not None and not package_log.handlers:
+        level, fmt = log_setup
+        handler = logging.StreamHandler()
+        handler.setLevel(level)
+        handler.setFormatter(logging.Formatter(fmt))
+        package_log.addHandler(handler)
+        package_log.setLevel(logging.DEBUG)
+    _init_validation_worker(validator_cls, schema)
+    # Examples are logged when merging diagnostics in the main process
+    diagnostics.mute()
+    if result_cache is not None:
+        result_cache = cache.ResultCache(result_cache)
+        # Unlike atexit hooks, this also runs in forked workers
+        multiprocessing.util.Finalize(None, result_cache.close, exitpriority=0)
+    _worker_check_file = functools.partial(
+        load_and_check,
+        schema_validator=_worker_validator,
+        schema_version=record_cache,
+        result_cache=result_cache,
+    )
+
+
+def _check_file_in_worker(efi_file, remove_invalid, profiling):
+    diagnostics.reset()
+    rules.reset_stats()
+    profile = Profile(enabled=profiling)
+    passed = check_single_file(
+        efi_file,
+        functools.partial(_worker_check_file, profile=profile),
+        remove_invalid=remove_invalid,
+        profile=profile,
+    )
+    return passed, diagnostics.collected(), profile, rules.rule_stats()
+
+
+def check_globally(
+    efi_files,
+    check_file: Callable,
+    remove_invalid=False,
+    profile: Profile = NULL_PROFILE,
+) -> bool:
+    """Check files resolving references across all of them.
+
+    Records of all files go into a single reference graph, one file
+    after the other by means of ``check_file`` (see load_and_check()).
+    Graph positions of the records in a file start where those of the
+    previous file end. Once all files are in, references are checked
+    and invalid records are removed from or reported for each file.
+
+    Returns
+    -------
+    bool
+        True if all checks have passed successfully, False otherwise.
+
+    """
+    all_was_fine = True
+    graph = ReferenceGraph()
+    offsets = [0]
+    for efi_file in efi_files:
+        passed, count = check_file(efi_file, graph, offset=offsets[-1])
+        if not passed:
+            all_was_fine = False
+        offsets.append(offsets[-1] + count)
+    log.info(f"Resolving references across {len(efi_files)} files")
+    if not check_references(graph, remove_invalid=True, profile=profile):
+        all_was_fine = False
+    removed = [set() for _ in efi_files]
+    for pos in graph.removed:
+        file_no = bisect_right(offsets, pos) - 1
+        removed[file_no].add(pos - offsets[file_no])
+    for file_no, efi_file in enumerate(efi_files):
+        count = offsets[file_no + 1] - offsets[file_no]
+        if removed[file_no]:
+            remove_records(
+                efi_file,
+                count,
+                removed[file_no],
+                remove_invalid,
+                profile=profile,
+            )
         else:
-            log.info(f"All {old_count} records passed the checks successfully")
+            log.info(
+                f"All {count} records in {efi_file} passed the checks"
+                f" successfully"
+            )
+    return all_was_fine
+
+
+def load_and_check(
+    efi_file,
+    graph: "ReferenceGraph",
+    schema_validator,
+    executor: Executor | None = None,
+    schema_version: str | None = None,
+    result_cache: cache.ResultCache | None = None,
+    offset: int = 0,
+    batch_size: int | None = None,
+    profile: Profile = NULL_PROFILE,
+) -> tuple[bool, int]:
+    """Load records from file, check them and add them to ``graph``.
+
+    See check_records(), which is called with ``remove_invalid`` set,
+    for details. Records are loaded and checked in batches of
+    ``batch_size``, CHECK_BATCH_SIZE by default (see also
+    check_batch_size()), and dropped afterwards, so memory usage does
+    not depend on the size of the file, except for the compact nodes of
+    ``graph``. If ``executor`` is given, the next batch is validated
+    against the schema in its process pool while the current process
+    checks the previous one, see ValidationQueue, so two batches are
+    held in memory at a time. Together with check_references() and
+    remove_records(), which copies surviving records byte by byte, this
+    allows for checking files larger than the available memory. However,
+    the whole file is loaded at once by means of the record cache if
+    ``schema_version`` is given. Results are taken from and stored in
+    ``result_cache``, if given. Loading is measured as a phase of
+    ``profile``, just like the steps of check_records().
+
+    Returns
+    -------
+    tuple[bool, int]
+        True if all checks have passed successfully, False otherwise,
+        and the number of records in the file.
+
+    """
+    log.info(f"Processing {efi_file}")
+    if schema_version is not None:
+        batches = iter([cache.load_decoded(efi_file, schema_version)])
+    else:
+        batches = avefi.iter_load_decoded(
+            efi_file, batch_size or CHECK_BATCH_SIZE
+        )
+    queue = None
+    if executor is not None:
+        queue = ValidationQueue(schema_validator, executor)
+    all_was_fine = True
+    count = 0
+    reused = 0
+    # Batches loaded but not checked yet, along with their violations
+    # known from the result cache, positions of the records still to
+    # be checked and ticket for their validation in the process pool
+    pending = deque()
+    try:
+        while True:
+            with profile.phase("load"):
+                decoded = next(batches, None)
+            if decoded is not None:
+                profile.count("load", len(decoded.records))
+                violations = None
+                unknown = range(len(decoded.records))
+                if result_cache is not None:
+                    violations = result_cache.get(decoded.digests)
+                    unknown = [
+                        pos
+                        for pos, found in enumerate(violations)
+                        if found is None
+                    ]
+                    reused += len(violations) - len(unknown)
+                ticket = None
+                if queue is not None:
+                    ticket = queue.submit(
+                        decoded.instances[pos] for pos in unknown
+                    )
+                pending.append((decoded, violations, unknown, ticket))
+            # With a process pool, the workers validate the batch just
+            # loaded while the previous one is checked here
+            while pending and (
+                decoded is None or queue is None or len(pending) > 1
+            ):
+                batch, violations, unknown, ticket = pending.popleft()
+                if ticket is not None:
+                    with profile.phase("schema validation", len(unknown)):
+                        queue.wait(ticket)
+                if not check_records(
+                    graph,
+                    batch.records,
+                    schema_validator,
+                    remove_invalid=True,
+                    instances=batch.instances,
+                    violations=violations,
+                    offset=offset + count,
+                    profile=profile,
+                    validated=ticket is not None,
+                ):
+                    all_was_fine = False
+                if result_cache is not None:
+                    result_cache.put(
+                        (batch.digests[pos], violations[pos])
+                        for pos in unknown
+                    )
+                count += len(batch.records)
+            if decoded is None:
+                break
+    finally:
+        if queue is not None:
+            queue.cancel()
+    if result_cache is not None:
+        log.info(f"Reused results for {reused} of {count} records")
+    return all_was_fine, count
+
+
+def check_batch_size(jobs: int = 1) -> int:
+    """Return number of records per batch for load_and_check().
+
+    With a process pool of ``jobs`` workers, batches are rounded up to
+    a multiple of ``jobs`` chunks of VALIDATION_CHUNK_SIZE records, so
+    that every worker gets the same number of full chunks per batch.
+
+    """
+    if jobs <= 1:
+        return CHECK_BATCH_SIZE
+    step = jobs * VALIDATION_CHUNK_SIZE
+    return -(-CHECK_BATCH_SIZE // step) * step
+
+
+def remove_records(
+    efi_file,
+    count: int,
+    removed: Container[int],
+    remove_invalid=False,
+    profile: Profile = NULL_PROFILE,
+):
+    """Remove invalid records from file or just report them.
+
+    ``removed`` holds the positions of the invalid records among the
+    ``count`` records in the file. Writing the file is measured as
+    phase "dump" of ``profile``.
+
+    """
+    keep = {pos for pos in range(count) if pos not in removed}
+    if remove_invalid:
+        with profile.phase("dump", len(keep)):
+            avefi.filter_file(efi_file, keep)
+        log.info(f"Successfully removed {count - len(keep)} invalid records")
+    else:
+        log.error(
+            f"Found {count - len(keep)} invalid records (no action taken)"
+        )
 
 
 def get_schema_validator(update_schema=False):
-    """Load AVefi JSON schema and initialise validator."""
+    """Load AVefi JSON schema and initialise validator.
+
+    The validator returned is compiled to Python code, see
+    validator.load_validator(). Checking the schema against its
+    metaschema is skipped if it has passed before.
+
+    """
     if update_schema:
         r = requests.get(SCHEMA_SOURCE)
         r.raise_for_status()
@@ -96,48 +580,191 @@ def get_schema_validator(update_schema=False):
                     f"{SCHEMA_FILE} has not been updated in 30 days, please"
                     f" consider using the --update-schema option"
                 )
-            with SCHEMA_FILE.open() as f:
-                schema = json.load(f)
         except FileNotFoundError:
             return get_schema_validator(update_schema=True)
 
-    cls = validator_for(schema)
-    cls.check_schema(schema)
-    validator = cls(schema)
-    return validator
+    return load_validator(SCHEMA_FILE)
+
 
+def validation_pool(schema_validator, jobs: int) -> ProcessPoolExecutor:
+    """Return process pool for validating records in parallel.
 
-class HashableId:
-    def __init__(self, identifier: efi.MovingImageResource):
-        self.identifier = identifier
-        self.name = f"{self.identifier.category}.{self.identifier.id}"
+    Every worker process sets up its own instance of the class of
+    ``schema_validator`` once, when it is started.
+
+    """
+    return ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_validation_worker,
+        initargs=(type(schema_validator), schema_validator.schema),
+    )
 
-    def __eq__(self, other) -> bool:
-        """Check equality to another object."""
-        return other.identifier == self.identifier
 
-    def __hash__(self):
-        """Return hash of the name attribute."""
-        return hash(self.name)
+def _init_validation_worker(validator_cls, schema):
+    global _worker_validator
+    _worker_validator = validator_cls(schema)
 
-    def __str__(self):
-        """Return name attribute."""
-        return self.name
+
+def _first_invalid(instances: list[dict]) -> int | None:
+    for i, instance in enumerate(instances):
+        for _ in _worker_validator.iter_errors(instance):
+            return i
+    return None
+
+
+def validate_records(
+    instances: Iterable[dict],
+    schema_validator,
+    executor: Executor,
+):
+    """Validate decoded records against the schema in a process pool.
+
+    Records are handed to the workers of ``executor`` in chunks of
+    VALIDATION_CHUNK_SIZE, with at most VALIDATION_MAX_PENDING chunks
+    queued at a time. Results are collected in order, so the error
+    raised is the same as in a serial run, i.e. the best match for the
+    first invalid record, no matter which worker finishes first.
+
+    Raises
+    ------
+    jsonschema.exceptions.ValidationError
+        If any record does not comply with the schema.
+
+    """
+    queue = ValidationQueue(schema_validator, executor)
+    queue.wait(queue.submit(instances))
+
+
+class ValidationQueue:
+    """Records queued for validation against the schema in a pool.
+
+    Records may be submitted in several batches, so that the workers
+    of ``executor`` can go on with the next batch while the current
+    process deals with the previous one, see load_and_check(). Other
+    than that, it works like validate_records(), i.e. chunks of
+    VALIDATION_CHUNK_SIZE records are validated with at most
+    VALIDATION_MAX_PENDING chunks queued at a time, and results are
+    collected in order.
+
+    """
+
+    def __init__(self, schema_validator, executor: Executor):
+        self.schema_validator = schema_validator
+        self.executor = executor
+        self.pending = deque()
+        self.submitted = 0
+        self.checked = 0
+
+    def submit(self, instances: Iterable[dict]) -> int:
+        """Queue decoded records and return ticket to wait() for."""
+        instances = iter(instances)
+        while chunk := list(islice(instances, VALIDATION_CHUNK_SIZE)):
+            future = self.executor.submit(_first_invalid, chunk)
+            self.pending.append((chunk, future))
+            self.submitted += 1
+            if len(self.pending) >= VALIDATION_MAX_PENDING:
+                self._check_next()
+        return self.submitted
+
+    def wait(self, ticket: int):
+        """Wait until all records submitted up to ``ticket`` are valid.
+
+        Raises
+        ------
+        jsonschema.exceptions.ValidationError
+            If any of these records does not comply with the schema.
+
+        """
+        while self.checked < ticket:
+            self._check_next()
+
+    def cancel(self):
+        """Cancel validation of all records not checked yet."""
+        for _, future in self.pending:
+            future.cancel()
+
+    def _check_next(self):
+        chunk, future = self.pending.popleft()
+        self.checked += 1
+        index = future.result()
+        if index is not None:
+            self.cancel()
+            raise best_match(self.schema_validator.iter_errors(chunk[index]))
+
+
+class IdentifierTable:
+    """Intern identifiers as consecutive integer keys.
+
+    Identifiers are considered the same if they agree in category and
+    id. Keys are handed out in the order identifiers are first seen,
+    so data per identifier can be kept in flat arrays indexed by key
+    rather than in dictionaries.
+
+    Attributes
+    ----------
+    categories : array.array
+        Category code by key, see category() for the name.
+    ids : list[str]
+        Identifier string by key.
+
+    """
+
+    def __init__(self):
+        self._codes = {}
+        self._category_names = []
+        self._keys = []
+        self.categories = array("B")
+        self.ids = []
+
+    def __len__(self):
+        """Return number of identifiers."""
+        return len(self.ids)
+
+    def key(self, identifier: efi.MovingImageResource) -> int:
+        """Return key of ``identifier``, adding it if necessary."""
+        code = self._codes.get(identifier.category)
+        if code is None:
+            code = len(self._category_names)
+            self._codes[identifier.category] = code
+            self._category_names.append(identifier.category)
+            self._keys.append({})
+        keys = self._keys[code]
+        key = keys.get(identifier.id)
+        if key is None:
+            key = keys[identifier.id] = len(self.ids)
+            self.categories.append(code)
+            self.ids.append(identifier.id)
+        return key
+
+    def category(self, key: int) -> str:
+        """Return category of the identifier with ``key``."""
+        return self._category_names[self.categories[key]]
+
+    def name(self, key: int) -> str:
+        """Return category and id of the identifier with ``key``."""
+        return f"{self.category(key)}.{self.ids[key]}"
 
 
 def pass_checks(
     efi_records: list[efi.MovingImageRecord],
     schema_validator,
     remove_invalid=False,
+    executor: Executor | None = None,
+    instances: list[dict] | None = None,
+    violations: list[list | None] | None = None,
 ) -> bool:
     """Check records against schema and additional rules.
 
     Validate against AVefi schema and check various additional rules
     like field length limits, required identifiers, resolvable
-    references, etc.
+    references, etc. See check_records() and check_references() for
+    the details.
 
     Note that this function may have obvious side effects on
-    ``efi_records`` if ``remove_invalid`` is set to True.
+    ``efi_records`` if ``remove_invalid`` is set to True. Records are
+    not taken out of the list one by one, though. Instead, they are
+    marked for removal and the list is compacted once at the end.
+    The same goes for ``instances``, if given.
 
     Parameters
     ----------
@@ -147,6 +774,82 @@ def pass_checks(
         Validator instance as returned by get_schema_validator().
     remove_invalid : bool
         Remove records from the list if they violate any of the rules.
+    executor : Executor, optional
+        Pool as returned by validation_pool(). If given, schema
+        validation of all records is carried out by its workers
+        before anything else.
+    instances : list[dict], optional
+        Decoded JSON of ``efi_records`` in the same order, as returned
+        by avefi.load_decoded(). This is what gets validated against
+        the schema, if given. Otherwise, records are dumped by pydantic
+        for validation.
+    violations : list[list[rules.Violation] | None], optional
+        Results of earlier checks by record position, None for records
+        not checked yet. Records with results are neither validated
+        against the schema nor checked against the rules again, the
+        violations given are reported instead. The others get their
+        results filled in, once they have passed validation. Unlike
+        ``efi_records``, the list is never compacted.
+
+    Returns
+    -------
+    bool
+        True if all checks have passed successfully, False otherwise.
+
+    """
+    graph = ReferenceGraph()
+    all_was_fine = check_records(
+        graph,
+        efi_records,
+        schema_validator,
+        remove_invalid=remove_invalid,
+        executor=executor,
+        instances=instances,
+        violations=violations,
+    )
+    if not check_references(graph, remove_invalid=remove_invalid):
+        all_was_fine = False
+
+    if graph.removed:
+        efi_records[:] = [
+            rec
+            for pos, rec in enumerate(efi_records)
+            if pos not in graph.removed
+        ]
+        if instances is not None:
+            instances[:] = [
+                instance
+                for pos, instance in enumerate(instances)
+                if pos not in graph.removed
+            ]
+    return all_was_fine
+
+
+def check_records(
+    graph: "ReferenceGraph",
+    efi_records: list[efi.MovingImageRecord],
+    schema_validator,
+    remove_invalid=False,
+    executor: Executor | None = None,
+    instances: list[dict] | None = None,
+    violations: list[list | None] | None = None,
+    offset: int = 0,
+    profile: Profile = NULL_PROFILE,
+    validated=False,
+) -> bool:
+    """Check records and add them to ``graph``.
+
+    This is the first part of pass_checks(), taking the same
+    arguments, except that ``efi_records`` and ``instances`` are left
+    alone. All records are validated against the schema first, then
+    checked against the rules and finally for unique identifiers.
+    Records passing these checks are added to ``graph`` at their
+    position plus ``offset``, which allows for adding records from
+    several files to the same graph. References are left for
+    check_references(). Each of the three steps is measured as a
+    phase of ``profile``. Validation against the schema is skipped if
+    ``validated`` is set, e.g. because it has been taken care of by a
+    ValidationQueue.
 
     Returns
     -------
@@ -154,409 +857,437 @@ def pass_checks(
         True if all checks have passed successfully, False otherwise.
 
     """
-    id_lookup = {}
-    dependants_by_ref = defaultdict(list)
     all_was_fine = True
-    removed_refs = []
+    if violations is None:
+        unchecked = range(len(efi_records))
+    else:
+        unchecked = [
+            pos for pos, found in enumerate(violations) if found is None
+        ]
+    if instances is None:
+        instances = _DumpedRecords(efi_records)
+    if not validated:
+        with profile.phase("schema validation", len(unchecked)):
+            unknown = (instances[pos] for pos in unchecked)
+            if executor is not None:
+                validate_records(unknown, schema_validator, executor)
+            else:
+                for instance in unknown:
+                    error = best_match(schema_validator.iter_errors(instance))
+                    if error is not None:
+                        raise error
 
-    # Check records and track dependencies
-    for rec in efi_records.copy():
-        error = best_match(schema_validator.iter_errors(rec.model_dump()))
-        if error is not None:
-            raise error
+    results = []
+    with profile.phase("rules", len(unchecked)):
+        for pos, rec in enumerate(efi_records):
+            if not rec.has_identifier:
+                raise ValueError(f"has_identifier is missing in record: {rec}")
+            found = None if violations is None else violations[pos]
+            if found is None:
+                try:
+                    found = rules.check_record(rec)
+                except Exception as e:
+                    raise RuntimeError(
+                        f"Error while checking record"
+                        f" {rec.has_identifier[0].id}",
+                    ) from e
+                if violations is not None:
+                    violations[pos] = found
+            for violation in found:
+                diagnostics.error(log, violation.rule, "{}", violation.message)
+            results.append(found)
 
-        if not rec.has_identifier:
-            raise ValueError(f"has_identifier is missing in record: {rec}")
-        try:
-            if has_invalid_value(rec):
+    with profile.phase("reference graph", len(efi_records)):
+        for pos, rec in enumerate(efi_records):
+            if results[pos]:
                 if all_was_fine:
                     all_was_fine = False
                 if remove_invalid:
-                    removed_refs.extend(
-                        [HashableId(id_) for id_ in rec.has_identifier]
+                    graph.removed_refs.update(
+                        graph.key(id_) for id_ in rec.has_identifier
                     )
-                    efi_records.remove(rec)
+                    graph.removed.add(offset + pos)
                     continue
-        except Exception as e:
-            raise RuntimeError(
-                f"Error while checking record {rec.has_identifier[0].id}",
-            ) from e
-
-        record_ids = []
-        for identifier in rec.has_identifier:
-            record_id = HashableId(identifier)
-            if record_id in id_lookup:
-                if all_was_fine:
-                    all_was_fine = False
-                err_msg = f"Identifier is not unique: {record_id}"
-                if remove_invalid:
-                    log.error(err_msg)
-                    efi_records.remove(rec)
-                else:
-                    raise ValueError(err_msg)
-                for record_id in record_ids:
-                    del id_lookup[record_id]
-                record_ids = []
-                break
-            record_ids.append(record_id)
-            id_lookup[record_id] = (rec, record_ids)
-        if not record_ids:
-            continue
+
+            record_ids = []
+            for identifier in rec.has_identifier:
+                record_id = graph.key(identifier)
+                if graph.lookup[record_id] >= 0 or record_id in record_ids:
+                    if all_was_fine:
+                        all_was_fine = False
+                    err_msg = (
+                        f"Identifier is not unique:"
+                        f" {graph.identifiers.name(record_id)}"
+                    )
+                    if remove_invalid:
+                        diagnostics.error(
+                            log, "duplicate_identifier", "{}", err_msg
+                        )
+                        graph.removed.add(offset + pos)
+                    else:
+                        raise ValueError(err_msg)
+                    record_ids = []
+                    break
+                record_ids.append(record_id)
+            if record_ids:
+                graph.add(offset + pos, rec, record_ids)
+    return all_was_fine
+
+
+def check_references(
+    graph: "ReferenceGraph",
+    remove_invalid=False,
+    profile: Profile = NULL_PROFILE,
+) -> bool:
+    """Check references between the records in ``graph``.
+
+    This is the second part of pass_checks(), to be called once all
+    records have been added by check_records(). Report references
+    that cannot be resolved and records that are dangling, i.e. not
+    associated with any items. If ``remove_invalid`` is set, mark
+    them for removal in ``graph`` along with all records depending on
+    them. Both steps are measured as phases of ``profile``.
+
+    Returns
+    -------
+    bool
+        True if all checks have passed successfully, False otherwise.
+
+    """
+    all_was_fine = True
+    # Check for references (to parent records) that cannot be resolved
+    with profile.phase("unresolved references"):
+        for ref in graph.unresolvable_refs():
+            if all_was_fine:
+                all_was_fine = False
+            if remove_invalid:
+                graph.purge(ref)
+            if ref not in graph.removed_refs:
+                diagnostics.error(
+                    log,
+                    "unresolvable_reference",
+                    "Unresolvable reference: {}",
+                    graph.identifiers.ids[ref],
+                )
+
+    # Check for records that should be associated with items but are not
+    with profile.phase("dangling records", len(graph.nodes)):
+        for pos in list(graph.nodes):
+            if pos in graph.removed:
+                continue
+            if graph.dangling(pos, remove=remove_invalid) and all_was_fine:
+                all_was_fine = False
+    return all_was_fine
+
+
+class _DumpedRecords(Sequence):
+    """Records dumped by pydantic on access, for lack of decoded JSON."""
+
+    def __init__(self, efi_records: list[efi.MovingImageRecord]):
+        self.efi_records = efi_records
+
+    def __len__(self):
+        """Return number of records."""
+        return len(self.efi_records)
+
+    def __getitem__(self, pos):
+        """Return record at ``pos`` dumped to a dict."""
+        if isinstance(pos, slice):
+            return [rec.model_dump() for rec in self.efi_records[pos]]
+        return self.efi_records[pos].model_dump()
+
+
+class RecordNode:
+    """Node in the reference graph standing in for one record.
+
+    Only what is needed to check references is retained from the
+    record, i.e. its category, its type, its identifiers and the
+    references to its parents.
+
+    """
+
+    __slots__ = ("category", "type", "ids", "is_part_of", "parents")
+
+    def __init__(
+        self,
+        category: str,
+        type: str | None,
+        ids: list[int],
+        is_part_of: list[int],
+        parents: list[int],
+    ):
+        self.category = category
+        self.type = type
+        self.ids = ids
+        self.is_part_of = is_part_of
+        self.parents = parents
+
+
+class ReferenceGraph:
+    """Records and the references between them.
+
+    Nodes are keyed by the position of the corresponding record in
+    the input, identifiers by their key in an IdentifierTable. Record
+    positions by identifier are kept in an array indexed by key. For
+    every referenced identifier, the graph keeps an
+    adjacency list of the positions of dependant records. Removed
+    records are tracked in a set, and removals cascade by means of
+    explicit worklists rather than recursion, hence arbitrarily deep
+    hierarchies can be processed. Adjacency lists preserve the input
+    order, so results do not depend on hashing.
+
+    Attributes
+    ----------
+    nodes : dict[int, RecordNode]
+        Nodes by record position.
+    identifiers : IdentifierTable
+        Keys of all identifiers seen so far.
+    lookup : array.array
+        Record position by identifier key, -1 for identifiers without
+        a record or with a removed record.
+    dependants : dict[int, list[int]]
+        Positions of records referencing an identifier.
+    removed : set[int]
+        Positions of records marked for removal.
+    removed_refs : set[int]
+        Identifiers of removed records.
+
+    """
+
+    def __init__(self):
+        self.identifiers = IdentifierTable()
+        self.nodes = {}
+        self.lookup = array("i")
+        self.dependants = {}
+        self.removed = set()
+        self.removed_refs = set()
+
+    def key(self, identifier: efi.MovingImageResource) -> int:
+        """Return key of ``identifier``, adding it if necessary."""
+        key = self.identifiers.key(identifier)
+        if key == len(self.lookup):
+            self.lookup.append(-1)
+        return key
+
+    def add(
+        self,
+        pos: int,
+        rec: efi.MovingImageRecord,
+        record_ids: list[int],
+    ):
+        """Add ``rec`` at position ``pos`` with its identifiers."""
+        work_type = None
         if isinstance(rec, efi.WorkVariant):
+            work_type = rec.type
             link_attributes = ("is_part_of", "is_variant_of")
+            parent_attributes = ("is_variant_of", "is_part_of")
         elif isinstance(rec, efi.Manifestation):
             # Ignore has_item here
             link_attributes = ("is_manifestation_of", "same_as")
+            parent_attributes = ("is_manifestation_of",)
         elif isinstance(rec, efi.Item):
             link_attributes = ("is_item_of", "is_copy_of", "is_derivative_of")
+            parent_attributes = ()
         else:
             raise ValueError(f"Cannot handle {type(rec)} (record={rec})")
+        links = {}
         for attr_name in link_attributes:
             attr = getattr(rec, attr_name)
             if attr is None:
                 attr = []
             elif not isinstance(attr, list):
                 attr = [attr]
-            for identifier in attr:
-                ref = HashableId(identifier)
-                dependants_by_ref[ref].append(record_id)
-
-    # Check for references (to parent records) that cannot be resolved
-    for ref in list(dependants_by_ref.keys()):
-        if (
-            ref not in id_lookup
-            and ref.identifier.category == "avefi:LocalResource"
-        ):
-            if all_was_fine:
-                all_was_fine = False
-            if remove_invalid:
-                purge_dependant_records(
-                    ref,
-                    efi_records,
-                    id_lookup,
-                    dependants_by_ref,
-                    removed_refs,
-                )
-            if ref not in removed_refs:
-                log.error(f"Unresolvable reference: {ref.identifier.id}")
-
-    # Check for records that should be associated with items but are not
-    for rec in efi_records.copy():
-        if (
-            dangling_record(
-                rec,
-                efi_records,
-                id_lookup,
-                dependants_by_ref,
-                removed_refs,
-                remove_dangling=remove_invalid,
-            )
-            and all_was_fine
-        ):
-            all_was_fine = False
-    return all_was_fine
+            links[attr_name] = refs = [
+                self.key(identifier) for identifier in attr
+            ]
+            for ref in refs:
+                self.dependants.setdefault(ref, []).append(pos)
+        parents = []
+        for attr_name in parent_attributes:
+            parents.extend(links[attr_name])
+        self.nodes[pos] = RecordNode(
+            rec.category,
+            work_type,
+            record_ids,
+            links.get("is_part_of", []),
+            parents,
+        )
+        for record_id in record_ids:
+            self.lookup[record_id] = pos
 
+    def unresolvable_refs(self) -> list[int]:
+        """Return local references not pointing to any known record."""
+        return [
+            ref
+            for ref in self.dependants
+            if self.lookup[ref] < 0
+            and self.identifiers.category(ref) == "avefi:LocalResource"
+        ]
 
-def purge_dependant_records(
-    ref: HashableId,
-    record_list: list[efi.MovingImageRecord],
-    id_lookup: dict[
-        HashableId, tuple[efi.MovingImageRecord, list[HashableId]]
-    ],
-    dependants_by_ref: dict[HashableId, list[HashableId]],
-    removed_refs: list[HashableId],
-):
-    """Remove all records identified by or dependant on ``ref``.
+    def purge(self, ref: int):
+        """Remove all records identified by or dependant on ``ref``.
 
-    Check whether ``ref`` has an associated record in ``id_lookup``,
-    remove it from ``record_list`` and all its identifiers from
-    ``id_lookup``. Recursively apply this function to all dependants
-    of ``ref`` and all known identifiers of the same record.
+        Check whether ``ref`` is the identifier of a known record and
+        mark it as removed. Then do the same for all records depending
+        on any identifier of that record or on ``ref``, respectively,
+        and so forth.
 
-    """
-    try:
-        rec, ids = id_lookup[ref]
-    except KeyError:
-        ids = [ref]
-    else:
-        record_list.remove(rec)
-        for record_id in ids:
-            del id_lookup[record_id]
-            removed_refs.append(record_id)
-            log.debug(
-                f"Reference to removed record: {record_id.identifier.id}"
-            )
+        """
+        if self.lookup[ref] >= 0:
+            stack = [self.lookup[ref]]
+        else:
+            # Records depending on an unknown or removed identifier
+            stack = self.dependants.pop(ref, [])[::-1]
+        while stack:
+            pos = stack.pop()
+            if pos in self.removed:
+                continue
+            self.removed.add(pos)
+            ids = self.nodes[pos].ids
+            for record_id in ids:
+                self.lookup[record_id] = -1
+                self.removed_refs.add(record_id)
+                log.debug(
+                    f"Reference to removed record:"
+                    f" {self.identifiers.ids[record_id]}"
+                )
+            deps = []
+            for record_id in ids:
+                deps.extend(self.dependants.pop(record_id, []))
+            stack.extend(reversed(deps))
 
-    for record_id in ids:
-        for dep_ref in dependants_by_ref[record_id]:
-            purge_dependant_records(
-                dep_ref,
-                record_list,
-                id_lookup,
-                dependants_by_ref,
-                removed_refs,
-            )
-        del dependants_by_ref[record_id]
+    def dangling(self, pos: int, remove=False) -> bool:
+        """Return True if record has neither items nor a PID yet.
 
+        Return False for items and records with a PID. Additionally,
+        return False for records that are referenced by some child
+        record. Otherwise, return True, except for works of type
+        analytic provided that they are linked to a parent with at
+        least one child that is not a work.
 
-def dangling_record(
-    rec: efi.MovingImageRecord,
-    record_list: list[efi.MovingImageRecord],
-    id_lookup: dict[HashableId, efi.MovingImageRecord],
-    dependants_by_ref: dict[HashableId, list[HashableId]],
-    removed_refs: list[HashableId],
-    remove_dangling=False,
-):
-    """Return True if record has neither items nor a PID yet.
+        Optionally, purge dangling records depending on the ``remove``
+        keyword argument. Parents losing their last child that way
+        are checked in turn.
 
-    Return False for items and records with a PID. Additionally,
-    return False for records that are referenced by some child record.
-    Otherwise, return True, except for works of type analytic provided
-    that they are linked to a parent with at least one child that is
-    not a work.
+        Raises
+        ------
+        ValueError
+            When a manifestation is linked to a work of type analytic.
 
-    Optionally, purge dangling records depending on the
-    ``remove_dangling`` keyword argument.
+        """
+        if not self._is_dangling(pos):
+            return False
+        if remove:
+            stack = [iter(self._remove_dangling(pos))]
+            while stack:
+                link = next(stack[-1], None)
+                if link is None:
+                    stack.pop()
+                    continue
+                child, ref = link
+                ref_deps = self.dependants.get(ref, [])
+                if child in ref_deps:
+                    ref_deps.remove(child)
+                if not ref_deps:
+                    self.dependants.pop(ref, None)
+                    parent = self.lookup[ref]
+                    # Check whether parent is dangling now and remove,
+                    # accordingly.
+                    if parent >= 0 and self._is_dangling(parent):
+                        stack.append(iter(self._remove_dangling(parent)))
+        return True
 
-    Raises
-    ------
-    ValueError
-        When a manifestation is linked to a work of type analytic.
+    def _remove_dangling(self, pos: int) -> list[tuple[int, int]]:
+        """Purge record at ``pos`` and return its links to parents."""
+        node = self.nodes[pos]
+        self.purge(node.ids[0])
+        return [(pos, ref) for ref in node.parents]
 
-    """
-    if rec.category == "avefi:Item":
-        return False
-
-    ids = [HashableId(id_) for id_ in rec.has_identifier]
-    if all(
-        id_.identifier.category == "avefi:LocalResource"
-        and id_ not in dependants_by_ref
-        for id_ in ids
-    ):
-        is_dangling = False
-        if rec.category == "avefi:WorkVariant" and rec.type == "Analytic":
+    def _is_dangling(self, pos: int) -> bool:
+        node = self.nodes[pos]
+        if node.category == "avefi:Item":
+            return False
+        if not all(
+            self.identifiers.category(id_) == "avefi:LocalResource"
+            and id_ not in self.dependants
+            for id_ in node.ids
+        ):
+            return False
+        record_id = self.identifiers.ids[node.ids[0]]
+        if node.category == "avefi:WorkVariant" and node.type == "Analytic":
             # No manifestation should link to an analytic work.
             if any(
-                id_ in dependants_by_ref
-                and id_lookup[id_][0].category == "avefi:Manifestation"
-                for id_ in ids
+                self.nodes[dep].category == "avefi:Manifestation"
+                for id_ in node.ids
+                for dep in self.dependants.get(id_, [])
             ):
                 raise ValueError(
                     f"Analytic work unexpectedly referenced by"
-                    f" manifestation(s): {ids[0].identifier.id}"
+                    f" manifestation(s): {record_id}"
                 )
 
             # Analytic works should always be part of another work.
-            if not rec.is_part_of:
-                log.error(
-                    f"Analytic work without is_part_of: "
-                    f"{rec.has_identifier[0].id}",
+            if not node.is_part_of:
+                diagnostics.error(
+                    log,
+                    "analytic_work_without_parent",
+                    "Analytic work without is_part_of: {}",
+                    record_id,
                 )
-                is_dangling = True
-            else:
-                # We need to make sure that parents of analytic works
-                # actually have other dependants than the analytic
-                # works themselves, i.e. a manifestation or
-                # supplemental material.
-                for identifier in rec.is_part_of:
-                    if identifier.category != "avefi:LocalResource":
-                        continue
-                    ref = HashableId(identifier)
-                    parent, p_ids = id_lookup[ref]
-                    # TODO: Uncomment if approved by Metadaten-experts
-                    # if parent.type != "Monographic":
-                    #     log.error(
-                    #         f"Analytic work {record_id} is part of work with"
-                    #         f" type other than monographic: {ref}"
-                    #     )
-                    #     is_dangling = True
-                    ref_deps = set()
-                    for id_ in p_ids:
-                        ref_deps.update(dependants_by_ref[id_])
-                    if not ref_deps or all(
-                        id_lookup[ref_dep][0].category == "avefi:WorkVariant"
-                        for ref_dep in ref_deps
-                    ):
-                        log.error(
-                            f"Analytic work is part of work without items: "
-                            f"{rec.has_identifier[0].id}",
-                        )
-                        is_dangling = True
-        else:
-            log.error(
-                f"No items associated with {rec.category}"
-                f" {rec.has_identifier[0].id}"
-            )
-            is_dangling = True
-        if is_dangling and remove_dangling:
-            refs = []
-            for attr_name in (
-                "is_manifestation_of",
-                "is_variant_of",
-                "is_part_of",
-            ):
-                ref = getattr(rec, attr_name, None)
-                if ref:
-                    if isinstance(ref, list):
-                        refs.extend(HashableId(r) for r in ref)
-                    else:
-                        refs.append(HashableId(ref))
-            purge_dependant_records(
-                ids[0],
-                record_list,
-                id_lookup,
-                dependants_by_ref,
-                removed_refs,
-            )
-            for ref in refs:
-                ref_deps = dependants_by_ref[ref]
-                for id_ in ids:
-                    if id_ in ref_deps:
-                        ref_deps.remove(id_)
-                if not ref_deps:
-                    del dependants_by_ref[ref]
-                    try:
-                        parent, p_ids = id_lookup[ref]
-                    except KeyError:
-                        pass
-                    else:
-                        # Check whether parent is dangling now and
-                        # remove, accordingly.
-                        dangling_record(
-                            parent,
-                            record_list,
-                            id_lookup,
-                            dependants_by_ref,
-                            removed_refs=removed_refs,
-                            remove_dangling=True,
-                        )
-        return is_dangling
-    return False
-
-
-def has_invalid_value(efi_record, preserve_status_removed=False):
-    def any_empty_has_name(elem_generator):
-        if any([not elem.has_name for elem in elem_generator]):
-            log.error(f"Empty has_name in {efi_record.has_identifier[0].id}")
-            return True
-        return False
-
-    if exceeds_field_limit(efi_record):
-        return True
-    for event in efi_record.has_event:
-        if has_invalid_date(efi_record):
-            return True
-        for activity in event.has_activity:
-            if any_empty_has_name(activity.has_agent):
                 return True
-        if any_empty_has_name(event.located_in):
-            return True
-    if isinstance(efi_record, efi.WorkVariant):
-        if any_empty_has_name(efi_record.has_genre):
-            return True
-        if any_empty_has_name(efi_record.has_subject):
-            return True
-        if (
-            efi_record.has_primary_title
-            and efi_record.has_primary_title.type
-            not in (
-                "PreferredTitle",
-                "SuppliedDevisedTitle",
-            )
-        ):
-            log.error(
-                f"Primary title type for work records is supposed to be"
-                f" one of ('PreferredTitle', 'SuppliedDevisedTitle'), found:"
-                f" {efi_record.has_primary_title.type} in record"
-                f" {efi_record.has_identifier[0].id}"
-            )
-            return True
-    else:
-        if (
-            efi_record.has_primary_title
-            and efi_record.has_primary_title.type
-            not in (
-                "TitleProper",
-                "SuppliedDevisedTitle",
-            )
-        ):
-            log.error(
-                f"Primary title type for non-work records is supposed to be"
-                f" one of ('TitleProper', 'SuppliedDevisedTitle'), found:"
-                f" {efi_record.has_primary_title.type} in record"
-                f" {efi_record.has_identifier[0].id}"
-            )
-            return True
-        if (
-            isinstance(efi_record, efi.Item)
-            and efi_record.has_access_status == "Removed"
-            and not any(
-                ident.category == "avefi:AVefiResource"
-                for ident in efi_record.has_identifier
-            )
-        ):
-            log.error(
-                f"Do not expect has_access_status=Removed for an item"
-                f" without a PID: {efi_record.has_identifier[0].id}"
-            )
-            return True
-    return False
-
-
-def exceeds_field_limit(efi_record):
-    titles = []
-    if efi_record.has_primary_title:
-        titles.append(efi_record.has_primary_title)
-    titles.extend(efi_record.has_alternative_title)
-    for title in titles:
-        if len(title.has_name) > settings.line_limit:
-            log.error(
-                f"Record {efi_record.has_identifier[0].id} violates limit of"
-                f" {settings.line_limit} characters on title length:"
-                f" {title.has_name}"
-            )
-            return True
-    if efi_record.category != "avefi:WorkVariant":
-        for note in efi_record.has_note:
-            if len(note) >= settings.text_limit:
-                log.error(
-                    f"Record {efi_record.has_identifier[0].id} violates limit"
-                    f" of {settings.text_limit} characters on has_note"
-                    f" entries"
-                )
-                return True
-    return False
+            # We need to make sure that parents of analytic works
+            # actually have other dependants than the analytic works
+            # themselves, i.e. a manifestation or supplemental
+            # material.
+            is_dangling = False
+            for ref in node.is_part_of:
+                if self.identifiers.category(ref) != "avefi:LocalResource":
+                    continue
+                parent = self.lookup[ref]
+                if parent < 0:
+                    # Already reported as unresolvable reference
+                    continue
+                # TODO: Uncomment if approved by Metadaten-experts
+                # if self.nodes[parent].type != "Monographic":
+                #     log.error(
+                #         f"Analytic work {record_id} is part of work with"
+                #         f" type other than monographic:"
+                #         f" {self.identifiers.name(ref)}"
+                #     )
+                #     is_dangling = True
+                ref_deps = set()
+                for id_ in self.nodes[parent].ids:
+                    ref_deps.update(
+                        dep
+                        for dep in self.dependants.get(id_, [])
+                        if dep not in self.removed
+                    )
+                if all(
+                    self.nodes[dep].category == "avefi:WorkVariant"
+                    for dep in ref_deps
+                ):
+                    diagnostics.error(
+                        log,
+                        "analytic_work_parent_without_items",
+                        "Analytic work is part of work without items: {}",
+                        record_id,
+                    )
+                    is_dangling = True
+            return is_dangling
+        diagnostics.error(
+            log,
+            "dangling_record",
+            "No items associated with {} {}",
+            node.category,
+            record_id,
+        )
+        return True
 
 
-def has_invalid_date(efi_record):
-    for event in efi_record.has_event:
-        if event.has_date and not re.search(
-            r"^-?([1-9][0-9]{3,}|0[0-9]{3})(-(0[1-9]|1[0-2])(-(0[1-9]|[12][0-9]|3[01]))?)?[?~]?(/-?([1-9][0-9]{3,}|0[0-9]{3})(-(0[1-9]|1[0-2])(-(0[1-9]|[12][0-9]|3[01]))?)?[?~]?)?$",
-            event.has_date,
-        ):
-            log.error(
-                f"Record {efi_record.has_identifier[0].id} has event(s) with"
-                f" invalid value in has_date: {event.has_date}"
-            )
-            return True
-
-        # Check if this is a period expression (contains '/')
-        if event.has_date and "/" in event.has_date:
-            # Split period and clean each part (keep only digits and hyphens)
-            period_parts = event.has_date.split("/")
-            if len(period_parts) == 2:
-                # Remove all characters except digits and hyphens
-                clean_start = re.sub(r"[^0-9-]", "", period_parts[0])
-                clean_end = re.sub(r"[^0-9-]", "", period_parts[1])
-
-                # Perform lexicographical comparison
-                # Equality is valid, only invalid when start > end
-                if clean_start > clean_end:
-                    log.error(
-                        f"Record {efi_record.has_identifier[0].id} has"
-                        f" event with invalid period: {event.has_date}"
-                        f" (start {clean_start} must be less than or equal to"
-                        f" end {clean_end})"
-                    )
-                    return True
-    return False
+def log_rule_stats():
+    """Log how often each rule has been applied and violated."""
+    for r in rules.registered_rules():
+        log.debug(
+            f"Rule {r.kind}.{r.name}: {r.hits} violations in {r.calls}"
+            f" checks, {r.seconds:.3f}s"
+        )
@@ -0,0 +1,94 @@
+"""Dates and periods as used in has_date of AVefi events.
+
+Valid values are calendar dates with year, month and day precision
+according to ISO 8601, optionally qualified as uncertain (``?``) or
+approximate (``~``) as in EDTF, and periods made up of two such dates
+separated by a slash, e.g. ``1975-05-01``, ``1975?`` or
+``1972/1973-06``.
+
+The same values tend to occur over and over again in a set of records
+(think of production years), hence results of :func:`parse_date` are
+memoized.
+
+"""
+
+import functools
+import re
+from typing import NamedTuple
+
+_DATE = (
+    r"(-?(?:[1-9][0-9]{3,}|0[0-9]{3}))"
+    r"(?:-(0[1-9]|1[0-2])(?:-(0[1-9]|[12][0-9]|3[01]))?)?([?~]?)"
+)
+DATE_REGEX = re.compile(rf"^{_DATE}(?:/{_DATE})?$")
+# Maximum number of distinct strings memoized by parse_date()
+PARSE_CACHE_SIZE = 1 << 16
+
+
+class Date(NamedTuple):
+    """Date with year, month or day precision."""
+
+    year: int
+    month: int | None = None
+    day: int | None = None
+    qualifier: str = ""
+
+    def isoformat(self) -> str:
+        """Return date in ISO 8601 notation without qualifier."""
+        result = f"{'-' if self.year < 0 else ''}{abs(self.year):04d}"
+        if self.month is not None:
+            result += f"-{self.month:02d}"
+            if self.day is not None:
+                result += f"-{self.day:02d}"
+        return result
+
+    @property
+    def sort_key(self) -> tuple[int, int, int]:
+        """Key ordering dates, taking missing month or day as zero."""
+        return (self.year, self.month or 0, self.day or 0)
+
+
+class Period(NamedTuple):
+    """Start and end of a period, equal to each other for a date."""
+
+    start: Date
+    end: Date
+
+    @property
+    def is_ordered(self) -> bool:
+        """Return True unless the period ends before it starts."""
+        return self.start.sort_key <= self.end.sort_key
+
+
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_date(date_str: str) -> Period | None:
+    """Parse date or period, returning None if it is not valid.
+
+    Examples
+    --------
+    >>> parse_date("1972/1973-06?").end
+    Date(year=1973, month=6, day=None, qualifier='?')
+
+    """
+    match = DATE_REGEX.match(date_str)
+    if match is None:
+        return None
+    groups = match.groups()
+    start = _make_date(*groups[:4])
+    if groups[4] is None:
+        return Period(start, start)
+    return Period(start, _make_date(*groups[4:]))
+
+
+def is_valid_date(date_str: str) -> bool:
+    """Return True if ``date_str`` is a valid date or period."""
+    return parse_date(date_str) is not None
+
+
+def _make_date(year, month, day, qualifier) -> Date:
+    return Date(
+        int(year),
+        None if month is None else int(month),
+        None if day is None else int(day),
+        qualifier,
+    )
@@ -0,0 +1,161 @@
+"""Diagnostics counted by kind rather than logged one by one.
+
+Importers and checks tend to run into the same issue over and over
+again on large sets of records. Instead of logging every occurrence,
+:func:`report` counts occurrences by kind of message, logs only the
+first few of each kind (see ``settings.diagnostic_examples``) and
+keeps them as examples. :func:`log_summary` then logs a table with
+the number of occurrences of each kind at the end.
+
+Messages are given as templates for :meth:`str.format` along with
+their arguments and only formatted when actually logged, which keeps
+reporting cheap once the examples of a kind have been collected.
+
+Worker processes may keep quiet (see :func:`mute`) and hand their
+diagnostics over to the main process, see :func:`merge`.
+
+"""
+
+from collections.abc import Iterable
+import logging
+
+from .settings import settings
+
+log = logging.getLogger(__name__)
+
+
+class Diagnostic:
+    """Occurrences of one kind of message along with some examples."""
+
+    __slots__ = ("logger", "kind", "level", "template", "count", "examples")
+
+    def __init__(self, logger: str, kind: str, level: int, template: str):
+        self.logger = logger
+        self.kind = kind
+        self.level = level
+        self.template = template
+        self.count = 0
+        self.examples = []
+
+    def format(self, args: tuple) -> str:
+        """Return message for ``args`` of one occurrence."""
+        return self.template.format(*args)
+
+
+_diagnostics = {}
+_muted = False
+
+
+def report(
+    logger: logging.Logger, level: int, kind: str, template: str, *args
+):
+    """Count occurrence of message of ``kind``, log it if among the first.
+
+    Parameters
+    ----------
+    logger : logging.Logger
+        Logger of the reporting module.
+    level : int
+        Logging level, e.g. ``logging.WARNING``.
+    kind : str
+        Name of the kind of message, unique across all modules.
+    template : str
+        Message with replacement fields like ``{}`` for ``args``.
+
+    """
+    diagnostic = _diagnostics.get(kind)
+    if diagnostic is None:
+        diagnostic = _diagnostics[kind] = Diagnostic(
+            logger.name, kind, level, template
+        )
+    diagnostic.count += 1
+    if diagnostic.count <= settings.diagnostic_examples:
+        diagnostic.examples.append(args)
+        if not _muted and logger.isEnabledFor(level):
+            logger.log(level, diagnostic.format(args))
+    elif diagnostic.count == settings.diagnostic_examples + 1:
+        _log_suppressed(logger, diagnostic)
+
+
+def _log_suppressed(logger, diagnostic):
+    if not _muted:
+        logger.log(
+            diagnostic.level,
+            f"Not logging further messages of kind {diagnostic.kind},"
+            f" see summary",
+        )
+
+
+def info(logger: logging.Logger, kind: str, template: str, *args):
+    """Report message of ``kind`` with level INFO, see report()."""
+    report(logger, logging.INFO, kind, template, *args)
+
+
+def warning(logger: logging.Logger, kind: str, template: str, *args):
+    """Report message of ``kind`` with level WARNING, see report()."""
+    report(logger, logging.WARNING, kind, template, *args)
+
+
+def error(logger: logging.Logger, kind: str, template: str, *args):
+    """Report message of ``kind`` with level ERROR, see report()."""
+    report(logger, logging.ERROR, kind, template, *args)
+
+
+def collected() -> list[Diagnostic]:
+    """Return diagnostics in the order their kinds first occurred."""
+    return list(_diagnostics.values())
+
+
+def merge(others: Iterable[Diagnostic]):
+    """Add diagnostics collected elsewhere, e.g. in a worker process.
+
+    The examples of ``others`` are reported as if they had occurred
+    in the current process, further occurrences are just counted.
+
+    """
+    for other in others:
+        logger = logging.getLogger(other.logger)
+        for args in other.examples:
+            report(logger, other.level, other.kind, other.template, *args)
+        remaining = other.count - len(other.examples)
+        if not remaining:
+            continue
+        diagnostic = _diagnostics.get(other.kind)
+        if diagnostic is None:
+            diagnostic = _diagnostics[other.kind] = Diagnostic(
+                other.logger, other.kind, other.level, other.template
+            )
+        if diagnostic.count <= settings.diagnostic_examples:
+            _log_suppressed(logger, diagnostic)
+        diagnostic.count += remaining
+
+
+def mute(muted: bool = True):
+    """Stop logging examples, leaving that to whoever merges them."""
+    global _muted
+    _muted = muted
+
+
+def reset():
+    """Forget all diagnostics reported so far."""
+    _diagnostics.clear()
+
+
+def summary() -> str:
+    """Return table of the kinds reported with count and an example."""
+    lines = [f"{'Count':>9} {'Level':<8} {'Kind':<36} Example"]
+    for d in _diagnostics.values():
+        example = d.format(d.examples[0]) if d.examples else d.template
+        lines.append(
+            f"{d.count:>9} {logging.getLevelName(d.level):<8}"
+            f" {d.kind:<36} {example}"
+        )
+    return "\n".join(lines)
+
+
+def log_summary():
+    """Log summary() with the highest level reported, if anything."""
+    if not _diagnostics:
+        return
+    level = max(d.level for d in _diagnostics.values())
+    log.log(level, f"Summary of diagnostics:\n{summary()}")
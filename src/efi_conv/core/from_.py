@@ -1,17 +1,55 @@
+import contextlib
 import importlib
 import logging
+import re
 import types
 
 from avefi_schema import model_pydantic_v2 as efi
 import click
 
-from . import avefi
+from . import avefi, diagnostics
 from .cli import IMPORTERS, cli_main
 from .utils import described_by_issuer
 
 log = logging.getLogger(__name__)
 
 
+class ShardSize(click.ParamType):
+    """Number of records or, if followed by a unit, bytes per shard."""
+
+    name = "size"
+    units = {
+        "b": 1,
+        "kb": 1000,
+        "mb": 1000**2,
+        "gb": 1000**3,
+        "kib": 1 << 10,
+        "mib": 1 << 20,
+        "gib": 1 << 30,
+    }
+
+    def convert(self, value, param, ctx):
+        """Return tuple of shard size and unit (records or bytes)."""
+        if isinstance(value, tuple):
+            return value
+        match = re.fullmatch(r"\s*(\d+)\s*([a-z]*)\s*", value.lower())
+        if match is None or match.group(2) not in ("", *self.units):
+            self.fail(
+                f"{value!r} is neither a number of records nor a size in"
+                f" bytes like 100MB",
+                param,
+                ctx,
+            )
+        number, unit = match.groups()
+        if not unit:
+            size = (int(number), "records")
+        else:
+            size = (int(number) * self.units[unit], "bytes")
+        if size[0] < 1:
+            self.fail(f"Shard size must be positive: {value!r}", param, ctx)
+        return size
+
+
 @cli_main.command("from")
 @click.option(
     "-f",
@@ -26,21 +64,46 @@ log = logging.getLogger(__name__)
     type=click.Path(dir_okay=False, writable=True),
     help="Output file (stdout if not specified).",
 )
+@click.option(
+    "--jsonl/--json",
+    default=None,
+    help="Write JSON Lines, i.e. one record per line, instead of a JSON"
+    " array (default: depending on whether OUTPUT ends with .jsonl or"
+    " .ndjson).",
+)
+@click.option(
+    "--shard-size",
+    type=ShardSize(),
+    help="Split output into shards of this many records (e.g. 10000) or"
+    " bytes (e.g. 100MB) and write a manifest alongside.",
+)
 @click.argument("input_files", nargs=-1, type=click.Path(exists=True))
-def efi_from(input_files, output=None, **kwargs):
+def efi_from(input_files, output=None, jsonl=None, shard_size=None, **kwargs):
     """Convert files from some schema into a JSON file with AVefi records."""
     mod = importlib.import_module(f"..{kwargs['format']}", __package__)
-    generated_records = []
-    for input_file in input_files:
-        try:
-            generated_records.extend(import_file(mod, input_file))
-        except Exception as e:
-            raise RuntimeError(f"Failed to convert {input_file}") from e
-    if generated_records:
-        if output and output != "-":
-            avefi.dump(generated_records, output)
-        else:
-            print(avefi.dumps(generated_records, indent=2))
+    if output == "-":
+        output = None
+    if shard_size and output is None:
+        raise click.UsageError("--shard-size requires --output")
+    with contextlib.ExitStack() as stack:
+        writer = None
+        for input_file in input_files:
+            try:
+                generated_records = import_file(mod, input_file)
+            except Exception as e:
+                raise RuntimeError(f"Failed to convert {input_file}") from e
+            # Do not produce any output unless there are records
+            if generated_records and writer is None:
+                if shard_size:
+                    writer = avefi.ShardedWriter(
+                        output, *shard_size, jsonl=jsonl
+                    )
+                else:
+                    writer = avefi.AvefiWriter(output, jsonl=jsonl)
+                stack.enter_context(writer)
+            if writer is not None:
+                writer.write_all(generated_records)
+    diagnostics.log_summary()
 
 
 def import_file(
@@ -48,16 +111,22 @@ def import_file(
     input_file: str,
 ) -> list[efi.MovingImageRecord]:
     result = importer.efi_import(input_file)
+    missing_source_key = False
     for record in result:
         if not (record.has_identifier):
             raise ValueError("has_identifier missing for some record(s)")
         described_by = described_by_issuer(record, importer.ISSUER_INFO)
         if not (described_by.has_source_key):
-            log.warning(
-                f"Records with unspecified source key in {input_file},"
-                f" copying identifier to fill the gap"
-            )
+            missing_source_key = True
             described_by.has_source_key = [record.has_identifier[0].id]
         else:
             described_by.has_source_key.sort()
+    if missing_source_key:
+        diagnostics.warning(
+            log,
+            "unspecified_source_key",
+            "Records with unspecified source key in {}, copying"
+            " identifier to fill the gap",
+            input_file,
+        )
     return result
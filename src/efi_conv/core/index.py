@@ -0,0 +1,150 @@
+import json
+import logging
+import os
+import pathlib
+import sys
+
+import click
+
+from . import avefi
+from .cli import cli_main
+from .utils import open_file
+
+log = logging.getLogger(__name__)
+INDEX_SUFFIX = ".index.json"
+INDEX_VERSION = 1
+
+
+@cli_main.command("index")
+@click.argument(
+    "efi_files", nargs=-1, type=click.Path(dir_okay=False, exists=True)
+)
+def efi_index(efi_files):
+    """Build sidecar index mapping identifiers to records in EFI_FILES."""
+    for efi_file in efi_files:
+        index = build_index(efi_file)
+        log.info(f"Indexed {len(index)} identifiers in {efi_file}")
+
+
+@cli_main.command()
+@click.option(
+    "--category",
+    "-c",
+    help="Category of the identifier, e.g. avefi:LocalResource.",
+)
+@click.argument("efi_file", type=click.Path(dir_okay=False, exists=True))
+@click.argument("identifier")
+def show(efi_file, identifier, category=None):
+    """Print record with IDENTIFIER in EFI_FILE using its index.
+
+    The index is (re)built first if it is missing or outdated.
+
+    """
+    index = load_index(efi_file)
+    spans = lookup(index, identifier, category=category)
+    if not spans:
+        log.error(f"No record with identifier {identifier} in {efi_file}")
+        sys.exit(1)
+    for offset, length in spans:
+        sys.stdout.buffer.write(read_record(efi_file, offset, length))
+        sys.stdout.buffer.write(b"\n")
+
+
+def index_file(efi_file: pathlib.Path | str) -> pathlib.Path:
+    """Return path of the sidecar index belonging to ``efi_file``."""
+    efi_file = pathlib.Path(efi_file)
+    return efi_file.with_name(f"{efi_file.name}{INDEX_SUFFIX}")
+
+
+def build_index(
+    efi_file: pathlib.Path | str,
+) -> dict[tuple[str, str], tuple[int, int]]:
+    """Build index of ``efi_file`` and save it alongside.
+
+    Records are located by the tokenizer of :func:`avefi.iter_raw_spans`
+    and only decoded as far as needed to read their identifiers, i.e.
+    without validating them. Offsets and lengths refer to the
+    uncompressed content of ``efi_file``.
+
+    Returns
+    -------
+    dict[tuple[str, str], tuple[int, int]]
+        Byte offset and length of each record by (category, id) of
+        its identifiers.
+
+    """
+    efi_file = pathlib.Path(efi_file)
+    stat = efi_file.stat()
+    index = {}
+    entries = []
+    with open_file(efi_file) as f:
+        for offset, raw_record in avefi.iter_raw_spans(f.read):
+            span = (offset, len(raw_record))
+            for identifier in json.loads(raw_record)["has_identifier"]:
+                key = (identifier["category"], identifier["id"])
+                if key in index:
+                    log.warning(f"Identifier is not unique: {key}")
+                    continue
+                index[key] = span
+                entries.append([*key, *span])
+    tmp_file = index_file(efi_file).with_suffix(".tmp")
+    with tmp_file.open("w") as f:
+        json.dump(
+            {
+                "version": INDEX_VERSION,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "entries": entries,
+            },
+            f,
+        )
+    os.replace(tmp_file, index_file(efi_file))
+    return index
+
+
+def load_index(
+    efi_file: pathlib.Path | str,
+) -> dict[tuple[str, str], tuple[int, int]]:
+    """Return index of ``efi_file``, building it if need be.
+
+    See :func:`build_index` for details.
+
+    """
+    stat = pathlib.Path(efi_file).stat()
+    try:
+        with index_file(efi_file).open() as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return build_index(efi_file)
+    if (
+        data.get("version") != INDEX_VERSION
+        or data["size"] != stat.st_size
+        or data["mtime_ns"] != stat.st_mtime_ns
+    ):
+        log.info(f"Rebuilding outdated index of {efi_file}")
+        return build_index(efi_file)
+    return {
+        (category, id_): (offset, length)
+        for category, id_, offset, length in data["entries"]
+    }
+
+
+def lookup(
+    index: dict[tuple[str, str], tuple[int, int]],
+    identifier: str,
+    category: str | None = None,
+) -> list[tuple[int, int]]:
+    """Return spans of records with ``identifier`` (in ``category``)."""
+    if category is not None:
+        span = index.get((category, identifier))
+        return [span] if span else []
+    return sorted(
+        {span for (_, id_), span in index.items() if id_ == identifier}
+    )
+
+
+def read_record(efi_file: pathlib.Path | str, offset: int, length: int):
+    """Return serialised record at ``offset`` in ``efi_file``."""
+    with open_file(efi_file) as f:
+        f.seek(offset)
+        return f.read(length)
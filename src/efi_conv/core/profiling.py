@@ -0,0 +1,154 @@
+"""Measure time spent in the phases of a run.
+
+A :class:`Profile` adds up wall time, CPU time and the number of
+records processed per named phase. Phases are meant to be measured
+for batches of records rather than single records, so the overhead
+of measuring is negligible. NULL_PROFILE measures nothing and serves
+as the default wherever profiling is optional.
+
+"""
+
+import contextlib
+import sys
+import time
+
+
+class PhaseStats:
+    """Cumulative statistics of one phase."""
+
+    __slots__ = ("wall_time", "cpu_time", "records")
+
+    def __init__(self):
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.records = 0
+
+    @property
+    def records_per_second(self) -> float | None:
+        """Return throughput, None if nothing has been measured."""
+        if not self.records or not self.wall_time:
+            return None
+        return self.records / self.wall_time
+
+
+class Profile:
+    """Statistics of the phases of a run in the order first entered.
+
+    Note that CPU time is that of the current process only, i.e. work
+    done by worker processes is not included unless their profiles
+    are merged, see merge(). Times of phases run concurrently add up.
+    Peak memory usage is always that of the current process.
+
+    Parameters
+    ----------
+    enabled : bool
+        Whether to measure anything at all.
+
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.phases = {}
+
+    @contextlib.contextmanager
+    def _measure(self, name: str, records: int):
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            stats = self.phases.get(name)
+            if stats is None:
+                stats = self.phases[name] = PhaseStats()
+            stats.wall_time += time.perf_counter() - wall_start
+            stats.cpu_time += time.process_time() - cpu_start
+            stats.records += records
+
+    def phase(self, name: str, records: int = 0):
+        """Return context manager measuring the phase called ``name``.
+
+        Parameters
+        ----------
+        name : str
+            Name of the phase.
+        records : int
+            Number of records processed within the context.
+
+        """
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._measure(name, records)
+
+    def count(self, name: str, records: int):
+        """Add ``records`` to the number processed in phase ``name``."""
+        if self.enabled:
+            self.phases[name].records += records
+
+    def merge(self, other: "Profile"):
+        """Add statistics of ``other``, e.g. of a worker process."""
+        if not self.enabled:
+            return
+        for name, stats in other.phases.items():
+            own = self.phases.get(name)
+            if own is None:
+                own = self.phases[name] = PhaseStats()
+            own.wall_time += stats.wall_time
+            own.cpu_time += stats.cpu_time
+            own.records += stats.records
+
+    def report(self) -> dict:
+        """Return statistics of all phases and peak memory usage.
+
+        Peak memory usage is None if unknown, see peak_rss().
+
+        """
+        return {
+            "phases": [
+                {
+                    "name": name,
+                    "wall_time": stats.wall_time,
+                    "cpu_time": stats.cpu_time,
+                    "records": stats.records,
+                    "records_per_second": stats.records_per_second,
+                }
+                for name, stats in self.phases.items()
+            ],
+            "peak_rss": peak_rss(),
+        }
+
+    def format(self) -> str:
+        """Return statistics as a table in plain text."""
+        lines = [
+            f"{'Phase':<22} {'Wall (s)':>10} {'CPU (s)':>10}"
+            f" {'Records':>10} {'Records/s':>12}"
+        ]
+        for name, stats in self.phases.items():
+            rate = stats.records_per_second
+            lines.append(
+                f"{name:<22} {stats.wall_time:>10.3f}"
+                f" {stats.cpu_time:>10.3f} {stats.records:>10}"
+                f" {'-' if rate is None else f'{rate:.0f}':>12}"
+            )
+        max_rss = peak_rss()
+        if max_rss is not None:
+            lines.append(f"Peak RSS: {max_rss / (1 << 20):.1f} MiB")
+        return "\n".join(lines)
+
+
+NULL_PROFILE = Profile(enabled=False)
+
+
+def peak_rss() -> int | None:
+    """Return peak resident set size of the current process in bytes.
+
+    Returns None where the resource module is not available, i.e. on
+    platforms other than Unix.
+
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
@@ -0,0 +1,222 @@
+"""Rules AVefi records have to follow beyond the JSON schema.
+
+Each rule is a function registered with the :func:`rule` decorator
+for a kind of node in the record tree (see NODE_KINDS). It is called
+with the record and the node and returns an error message if the node
+violates the rule, None otherwise. :func:`check_record` visits every
+node of a record once, applies all rules registered for its kind and
+returns all violations found rather than stopping at the first one.
+
+Every rule keeps count of how often it has been applied and violated
+and of the time spent on it, see :func:`registered_rules`.
+
+"""
+
+from collections.abc import Callable, Iterator
+from time import perf_counter
+from typing import NamedTuple
+
+from avefi_schema import model_pydantic_v2 as efi
+
+from .dates import parse_date
+from .settings import settings
+
+NODE_KINDS = ("record", "title", "event", "name")
+
+
+class Rule:
+    """Rule as registered along with its statistics."""
+
+    __slots__ = ("name", "kind", "check", "calls", "hits", "seconds")
+
+    def __init__(self, name: str, kind: str, check: Callable):
+        self.name = name
+        self.kind = kind
+        self.check = check
+        self.calls = 0
+        self.hits = 0
+        self.seconds = 0.0
+
+
+class Violation(NamedTuple):
+    """Violation of a rule by some record."""
+
+    rule: str
+    message: str
+
+
+_rules = {kind: [] for kind in NODE_KINDS}
+
+
+def rule(kind: str, name: str | None = None):
+    """Register decorated function as a rule for nodes of ``kind``.
+
+    The name of the rule defaults to the name of the function.
+
+    """
+    if kind not in _rules:
+        raise ValueError(f"Unknown kind of node: {kind}")
+
+    def register(check):
+        _rules[kind].append(Rule(name or check.__name__, kind, check))
+        return check
+
+    return register
+
+
+def registered_rules() -> list[Rule]:
+    """Return all rules in the order of registration by node kind."""
+    return [r for kind in NODE_KINDS for r in _rules[kind]]
+
+
+def reset_stats():
+    """Reset counters and timing of all rules."""
+    for r in registered_rules():
+        r.calls = r.hits = 0
+        r.seconds = 0.0
+
+
+def rule_stats() -> list[tuple[int, int, float]]:
+    """Return calls, hits and seconds of all rules in registration order."""
+    return [(r.calls, r.hits, r.seconds) for r in registered_rules()]
+
+
+def merge_stats(stats: list[tuple[int, int, float]]):
+    """Add statistics returned by rule_stats(), e.g. in another process."""
+    for r, (calls, hits, seconds) in zip(
+        registered_rules(), stats, strict=True
+    ):
+        r.calls += calls
+        r.hits += hits
+        r.seconds += seconds
+
+
+def check_record(efi_record: efi.MovingImageRecord) -> list[Violation]:
+    """Apply all rules to ``efi_record`` and return the violations."""
+    violations = []
+    for kind, node in iter_nodes(efi_record):
+        for r in _rules[kind]:
+            start = perf_counter()
+            message = r.check(efi_record, node)
+            r.seconds += perf_counter() - start
+            r.calls += 1
+            if message is not None:
+                r.hits += 1
+                violations.append(Violation(r.name, message))
+    return violations
+
+
+def iter_nodes(efi_record: efi.MovingImageRecord) -> Iterator[tuple]:
+    """Yield the nodes of ``efi_record`` rules apply to with their kind."""
+    yield "record", efi_record
+    if efi_record.has_primary_title:
+        yield "title", efi_record.has_primary_title
+    for title in efi_record.has_alternative_title:
+        yield "title", title
+    for event in efi_record.has_event:
+        yield "event", event
+        for activity in event.has_activity:
+            for agent in activity.has_agent:
+                yield "name", agent
+        for place in event.located_in:
+            yield "name", place
+    if isinstance(efi_record, efi.WorkVariant):
+        for genre in efi_record.has_genre:
+            yield "name", genre
+        for subject in efi_record.has_subject:
+            yield "name", subject
+
+
+def _record_id(efi_record):
+    return efi_record.has_identifier[0].id
+
+
+@rule("record")
+def primary_title_type(efi_record, _):
+    title = efi_record.has_primary_title
+    if not title:
+        return None
+    if isinstance(efi_record, efi.WorkVariant):
+        if title.type not in ("PreferredTitle", "SuppliedDevisedTitle"):
+            return (
+                f"Primary title type for work records is supposed to be"
+                f" one of ('PreferredTitle', 'SuppliedDevisedTitle'), found:"
+                f" {title.type} in record {_record_id(efi_record)}"
+            )
+    elif title.type not in ("TitleProper", "SuppliedDevisedTitle"):
+        return (
+            f"Primary title type for non-work records is supposed to be"
+            f" one of ('TitleProper', 'SuppliedDevisedTitle'), found:"
+            f" {title.type} in record {_record_id(efi_record)}"
+        )
+    return None
+
+
+@rule("record")
+def note_length(efi_record, _):
+    if efi_record.category == "avefi:WorkVariant":
+        return None
+    for note in efi_record.has_note:
+        if len(note) >= settings.text_limit:
+            return (
+                f"Record {_record_id(efi_record)} violates limit"
+                f" of {settings.text_limit} characters on has_note"
+                f" entries"
+            )
+    return None
+
+
+@rule("record")
+def removed_without_pid(efi_record, _):
+    if (
+        isinstance(efi_record, efi.Item)
+        and efi_record.has_access_status == "Removed"
+        and not any(
+            ident.category == "avefi:AVefiResource"
+            for ident in efi_record.has_identifier
+        )
+    ):
+        return (
+            f"Do not expect has_access_status=Removed for an item"
+            f" without a PID: {_record_id(efi_record)}"
+        )
+    return None
+
+
+@rule("title")
+def title_length(efi_record, title):
+    if len(title.has_name) > settings.line_limit:
+        return (
+            f"Record {_record_id(efi_record)} violates limit of"
+            f" {settings.line_limit} characters on title length:"
+            f" {title.has_name}"
+        )
+    return None
+
+
+@rule("event")
+def event_date(efi_record, event):
+    if not event.has_date:
+        return None
+    period = parse_date(event.has_date)
+    if period is None:
+        return (
+            f"Record {_record_id(efi_record)} has event(s) with"
+            f" invalid value in has_date: {event.has_date}"
+        )
+    # Equality is valid, only invalid when start > end
+    if not period.is_ordered:
+        return (
+            f"Record {_record_id(efi_record)} has"
+            f" event with invalid period: {event.has_date}"
+            f" (start {period.start.isoformat()} must be less than or"
+            f" equal to end {period.end.isoformat()})"
+        )
+    return None
+
+
+@rule("name")
+def empty_name(efi_record, named):
+    if not named.has_name:
+        return f"Empty has_name in {_record_id(efi_record)}"
+    return None
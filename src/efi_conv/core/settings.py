@@ -6,6 +6,10 @@ class Settings(BaseSettings):
 
     line_limit: int = 250
     text_limit: int = 8192
+    # Maximum size of the record cache in bytes
+    record_cache_size: int = 1 << 30
+    # Number of messages of each kind logged before only counting them
+    diagnostic_examples: int = 5
 
 
 settings = Settings()
@@ -1,5 +1,22 @@
+import bz2
+import gzip
+import hashlib
+import lzma
+import pathlib
+
 from avefi_schema import model_pydantic_v2 as efi
 
+COMPRESSION_BY_SUFFIX = {
+    ".bz2": bz2,
+    ".gz": gzip,
+    ".xz": lzma,
+}
+COMPRESSION_BY_MAGIC = {
+    b"BZh": bz2,
+    b"\x1f\x8b": gzip,
+    b"\xfd7zXZ\x00": lzma,
+}
+
 
 def described_by_issuer(
     record: efi.MovingImageRecord, issuer: dict
@@ -32,3 +49,62 @@ def described_by_issuer(
             record.described_by = efi.DescriptionResource(**issuer)
             described_by = record.described_by
     return described_by
+
+
+def open_file(path: pathlib.Path | str, mode="rb", **kwargs):
+    """Open file, transparently (de)compressing it if applicable.
+
+    Supported compression formats are gzip, xz and bzip2. When
+    reading, compression is detected by the magic bytes at the
+    beginning of the file, when writing, by the file name suffix.
+    Data is (de)compressed on the fly, i.e. without temporary files.
+
+    Parameters
+    ----------
+    path : pathlib.Path | str
+        File to be opened.
+    mode : str
+        Mode as for the built-in open function.
+    **kwargs
+        Further arguments to the built-in open function, e.g.
+        encoding (text mode only).
+
+    """
+    path = pathlib.Path(path)
+    if "r" in mode:
+        with path.open("rb") as f:
+            magic = f.read(6)
+        compression = next(
+            (
+                module
+                for prefix, module in COMPRESSION_BY_MAGIC.items()
+                if magic.startswith(prefix)
+            ),
+            None,
+        )
+    else:
+        compression = compression_by_suffix(path)
+    if compression is None:
+        return path.open(mode, **kwargs)
+    if "b" not in mode and "t" not in mode:
+        mode += "t"
+    return compression.open(path, mode, **kwargs)
+
+
+def compression_by_suffix(path: pathlib.Path | str):
+    """Return compression module matching the suffix of ``path``."""
+    return COMPRESSION_BY_SUFFIX.get(pathlib.Path(path).suffix.lower())
+
+
+def strip_compression_suffix(path: pathlib.Path | str) -> pathlib.Path:
+    """Return ``path`` without suffix indicating compression."""
+    path = pathlib.Path(path)
+    if compression_by_suffix(path) is not None:
+        path = path.with_suffix("")
+    return path
+
+
+def file_digest(path: pathlib.Path | str) -> str:
+    """Return SHA-256 hex digest of file content."""
+    with pathlib.Path(path).open("rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
@@ -0,0 +1,530 @@
+"""Compile JSON schemas into Python code for faster validation.
+
+The jsonschema package interprets the schema tree anew for every
+instance it validates. For the large number of mostly valid records
+checked by efi-conv, it pays off to translate the schema into Python
+functions once instead. Generated modules are cached in CACHE_DIR by
+schema hash, which is trusted like the record cache (see
+cache.CACHE_DIR).
+
+The compiled code only decides whether an instance is valid. As soon
+as it is not, the instance is handed to the jsonschema validator
+again, so errors are always exactly the ones jsonschema reports.
+Subschemas using keywords not supported by the compiler are left to
+jsonschema as well.
+
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import tempfile
+import types
+from urllib.parse import unquote
+
+from jsonschema import (
+    Draft6Validator,
+    Draft7Validator,
+    Draft201909Validator,
+    Draft202012Validator,
+)
+from jsonschema.validators import validator_for
+
+from .cache import CACHE_DIR
+
+log = logging.getLogger(__name__)
+VALIDATOR_CACHE_DIR = CACHE_DIR / "validators"
+# Increment when changing the generated code to invalidate the cache
+COMPILER_VERSION = 1
+SUPPORTED_DRAFTS = (
+    Draft6Validator,
+    Draft7Validator,
+    Draft201909Validator,
+    Draft202012Validator,
+)
+# Keywords without effect on validation when no format checker is set
+IGNORED_KEYWORDS = {"$defs", "definitions", "$schema", "$comment", "format"}
+TYPE_CHECKS = {
+    "array": "isinstance({x}, list)",
+    "boolean": "isinstance({x}, bool)",
+    "integer": (
+        "(isinstance({x}, int) and not isinstance({x}, bool)"
+        " or isinstance({x}, float) and {x}.is_integer())"
+    ),
+    "null": "{x} is None",
+    "number": (
+        "(isinstance({x}, (int, float)) and not isinstance({x}, bool))"
+    ),
+    "object": "isinstance({x}, dict)",
+    "string": "isinstance({x}, str)",
+}
+NUMBER_CHECK = TYPE_CHECKS["number"]
+BOUNDS = {
+    "minimum": "<",
+    "maximum": ">",
+    "exclusiveMinimum": "<=",
+    "exclusiveMaximum": ">=",
+}
+LENGTH_BOUNDS = {
+    "minLength": ("str", "<"),
+    "maxLength": ("str", ">"),
+    "minItems": ("list", "<"),
+    "maxItems": ("list", ">"),
+    "minProperties": ("dict", "<"),
+    "maxProperties": ("dict", ">"),
+}
+SUPPORTED_KEYWORDS = {
+    "$ref",
+    "type",
+    "enum",
+    "const",
+    "pattern",
+    "required",
+    "properties",
+    "patternProperties",
+    "additionalProperties",
+    "propertyNames",
+    "items",
+    "anyOf",
+    "allOf",
+    "oneOf",
+    "not",
+    "if",
+    *BOUNDS,
+    *LENGTH_BOUNDS,
+}
+
+
+class CompiledValidator:
+    """JSON schema validator with a compiled fast path.
+
+    Provides the parts of the jsonschema validator interface used by
+    efi-conv, i.e. the ``schema`` attribute, ``is_valid()`` and
+    ``iter_errors()``. The class of the underlying jsonschema
+    validator is chosen by means of ``validator_for()``.
+
+    """
+
+    def __init__(self, schema: dict):
+        self.schema = schema
+        self.validator = validator_for(schema)(schema)
+        self._is_valid = load_compiled(self.validator)
+
+    def is_valid(self, instance) -> bool:
+        """Return True if ``instance`` complies with the schema."""
+        return self._is_valid(instance)
+
+    def iter_errors(self, instance):
+        """Return an iterator over validation errors of ``instance``."""
+        if self._is_valid(instance):
+            return iter(())
+        return self.validator.iter_errors(instance)
+
+
+def load_validator(schema_file: pathlib.Path) -> CompiledValidator:
+    """Return validator for the JSON schema in ``schema_file``.
+
+    The schema is checked against its metaschema only the first time
+    the file is seen with a particular content. Passing the check is
+    recorded in VALIDATOR_CACHE_DIR by file digest and the compiled
+    code is cached anyway (see load_compiled()), so later calls only
+    take reading, hashing and parsing the file.
+
+    Raises
+    ------
+    jsonschema.exceptions.SchemaError
+        If the schema does not comply with its metaschema.
+
+    """
+    data = pathlib.Path(schema_file).read_bytes()
+    schema = json.loads(data)
+    digest = hashlib.sha256(data).hexdigest()
+    checked = VALIDATOR_CACHE_DIR / f"checked_{digest}"
+    if checked.exists():
+        log.debug(f"Skipping metaschema check of {schema_file}")
+    else:
+        validator_for(schema).check_schema(schema)
+        VALIDATOR_CACHE_DIR.mkdir(exist_ok=True, parents=True)
+        checked.touch()
+    return CompiledValidator(schema)
+
+
+def load_compiled(validator):
+    """Return compiled validation function for ``validator.schema``.
+
+    The generated module is taken from VALIDATOR_CACHE_DIR if already
+    present and written there otherwise, along with the SHA-256
+    digest of its source. Cached code is only executed if it matches
+    that digest and compiled anew otherwise. This detects corrupt
+    files, e.g. truncated by a full disk, not tampering, as the digest
+    is kept in the same directory.
+
+    """
+    schema = validator.schema
+    key = hashlib.sha256(
+        json.dumps(
+            [COMPILER_VERSION, type(validator).__name__, schema],
+            sort_keys=True,
+        ).encode()
+    ).hexdigest()
+    path = VALIDATOR_CACHE_DIR / f"schema_{key}.py"
+    digest_path = path.with_suffix(".sha256")
+    source = None
+    try:
+        cached = path.read_bytes()
+        digest = digest_path.read_text().strip()
+    except FileNotFoundError:
+        pass
+    else:
+        if hashlib.sha256(cached).hexdigest() == digest:
+            source = cached
+        else:
+            log.warning(f"Ignoring {path} not matching its digest")
+    if source is None:
+        log.debug(f"Compiling JSON schema to {path}")
+        source = compile_schema(schema, type(validator)).encode()
+        VALIDATOR_CACHE_DIR.mkdir(exist_ok=True, parents=True)
+        _write_atomically(path, source)
+        _write_atomically(
+            digest_path, hashlib.sha256(source).hexdigest().encode()
+        )
+    # Execute the source just verified rather than reading the file again
+    module = types.ModuleType(path.stem)
+    module.__file__ = str(path)
+    exec(compile(source, path, "exec"), module.__dict__)
+
+    def fallback(pointer):
+        subschema = resolve_pointer(schema, pointer)
+        return validator.evolve(schema=subschema).is_valid
+
+    return module.build(fallback)
+
+
+def _write_atomically(path: pathlib.Path, data: bytes):
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+def compile_schema(schema, validator_cls=None) -> str:
+    """Return Python source code of a module validating ``schema``.
+
+    The module defines a function ``build(fallback)`` returning the
+    validation function. ``fallback`` is called with the JSON pointer
+    of every subschema the compiler cannot handle and must return a
+    function validating instances against that subschema.
+
+    """
+    if validator_cls is None:
+        validator_cls = validator_for(schema)
+    return _Compiler(schema, validator_cls).compile()
+
+
+def resolve_pointer(schema, pointer: str):
+    """Return the subschema of ``schema`` at JSON ``pointer``."""
+    node = schema
+    if pointer:
+        for token in pointer[1:].split("/"):
+            token = token.replace("~1", "/").replace("~0", "~")
+            if isinstance(node, list):
+                token = int(token)
+            node = node[token]
+    return node
+
+
+def _join(pointer: str, *tokens) -> str:
+    for token in tokens:
+        token = str(token).replace("~", "~0").replace("/", "~1")
+        pointer = f"{pointer}/{token}"
+    return pointer
+
+
+class _Compiler:
+    def __init__(self, schema, validator_cls):
+        self.schema = schema
+        self.validator_cls = validator_cls
+        # Siblings of $ref are ignored up to draft 7
+        self.exclusive_ref = validator_cls in (
+            Draft6Validator,
+            Draft7Validator,
+        )
+        self.functions = {}
+        self.queue = []
+        self.fallbacks = []
+        self.constants = []
+        self.body = []
+
+    def compile(self) -> str:
+        root = self.function("")
+        while self.queue:
+            pointer = self.queue.pop(0)
+            self.compile_function(pointer)
+        lines = [
+            '"""Generated by efi_conv.core.validator, do not edit."""',
+            "",
+            "import re",
+            "",
+            "",
+            "def build(fallback):",
+            *(f"    {line}" if line else "" for line in self.body),
+            # Constants may refer to the functions defined above
+            *(f"    {line}" for line in self.fallbacks),
+            *(f"    {line}" for line in self.constants),
+            f"    return {root}",
+            "",
+        ]
+        return "\n".join(lines)
+
+    def function(self, pointer: str) -> str:
+        """Return name of the function validating ``pointer``."""
+        name = self.functions.get(pointer)
+        if name is None:
+            name = self.functions[pointer] = f"_v{len(self.functions)}"
+            self.queue.append(pointer)
+        return name
+
+    def constant(self, expression: str) -> str:
+        name = f"_c{len(self.constants)}"
+        self.constants.append(f"{name} = {expression}")
+        return name
+
+    def compile_function(self, pointer: str):
+        name = self.functions[pointer]
+        schema = resolve_pointer(self.schema, pointer)
+        try:
+            lines = self.checks(schema, pointer)
+        except _Unsupported as e:
+            log.debug(f"Leaving {pointer or '/'} to jsonschema: {e}")
+            self.fallbacks.append(f"{name} = fallback({pointer!r})")
+            return
+        self.body.append(f"def {name}(x):")
+        self.body.extend(f"    {line}" for line in lines)
+        self.body.append("    return True")
+        self.body.append("")
+
+    def checks(self, schema, pointer: str) -> list[str]:
+        if schema is True:
+            return []
+        if schema is False:
+            return ["return False"]
+        if not isinstance(schema, dict):
+            raise _Unsupported(f"schema of type {type(schema)}")
+        if self.validator_cls not in SUPPORTED_DRAFTS:
+            raise _Unsupported(self.validator_cls.__name__)
+        # Like jsonschema, disregard keywords unknown to the draft
+        keywords = set(schema) & set(self.validator_cls.VALIDATORS)
+        if "$ref" in schema and self.exclusive_ref:
+            keywords = {"$ref"}
+        if "$id" in schema and pointer:
+            raise _Unsupported("$id in subschema")
+        unsupported = keywords - SUPPORTED_KEYWORDS - IGNORED_KEYWORDS
+        if unsupported:
+            raise _Unsupported(", ".join(sorted(unsupported)))
+        lines = []
+        if "$ref" in keywords:
+            ref = schema["$ref"]
+            if not ref.startswith("#"):
+                raise _Unsupported(f"$ref {ref}")
+            target = unquote(ref[1:])
+            try:
+                resolve_pointer(self.schema, target)
+            except (KeyError, IndexError, TypeError, ValueError):
+                raise _Unsupported(f"$ref {ref}") from None
+            lines.append(f"if not {self.function(target)}(x):")
+            lines.append("    return False")
+        if "type" in keywords:
+            types = schema["type"]
+            if isinstance(types, str):
+                types = [types]
+            if not set(types) <= set(TYPE_CHECKS):
+                raise _Unsupported(f"type {types!r}")
+            conditions = " or ".join(
+                TYPE_CHECKS[type_].format(x="x") for type_ in types
+            )
+            lines.append(f"if not ({conditions or 'False'}):")
+            lines.append("    return False")
+        for keyword in ("enum", "const"):
+            if keyword in keywords:
+                values = schema[keyword]
+                if keyword == "const":
+                    values = [values]
+                lines.extend(self.membership(values))
+        if "pattern" in keywords:
+            regex = self.constant(f"re.compile({schema['pattern']!r})")
+            lines.append(f"if isinstance(x, str) and not {regex}.search(x):")
+            lines.append("    return False")
+        for keyword, operator in BOUNDS.items():
+            if keyword in keywords:
+                bound = schema[keyword]
+                if isinstance(bound, bool) or not isinstance(
+                    bound, (int, float)
+                ):
+                    raise _Unsupported(f"{keyword} {bound!r}")
+                lines.append(
+                    f"if {NUMBER_CHECK.format(x='x')} and x {operator}"
+                    f" {bound!r}:"
+                )
+                lines.append("    return False")
+        for keyword, (type_, operator) in LENGTH_BOUNDS.items():
+            if keyword in keywords:
+                lines.append(
+                    f"if isinstance(x, {type_}) and len(x) {operator}"
+                    f" {int(schema[keyword])}:"
+                )
+                lines.append("    return False")
+        object_lines = self.object_checks(schema, keywords, pointer)
+        if object_lines:
+            lines.append("if isinstance(x, dict):")
+            lines.extend(f"    {line}" for line in object_lines)
+        if "items" in keywords:
+            items = schema["items"]
+            if not isinstance(items, (dict, bool)):
+                raise _Unsupported("items given as array")
+            item_function = self.function(_join(pointer, "items"))
+            lines.append("if isinstance(x, list):")
+            lines.append("    for v in x:")
+            lines.append(f"        if not {item_function}(v):")
+            lines.append("            return False")
+        for keyword, operator in (("anyOf", " or "), ("allOf", " and ")):
+            if keyword in keywords:
+                calls = self.calls(schema[keyword], pointer, keyword)
+                lines.append(f"if not ({operator.join(calls)}):")
+                lines.append("    return False")
+        if "oneOf" in keywords:
+            calls = self.calls(schema["oneOf"], pointer, "oneOf")
+            lines.append(f"if [{', '.join(calls)}].count(True) != 1:")
+            lines.append("    return False")
+        if "not" in keywords:
+            function = self.function(_join(pointer, "not"))
+            lines.append(f"if {function}(x):")
+            lines.append("    return False")
+        if "if" in keywords:
+            lines.extend(self.conditional(schema, keywords, pointer))
+        return lines
+
+    def object_checks(self, schema, keywords, pointer) -> list[str]:
+        lines = []
+        if "required" in keywords and schema["required"]:
+            conditions = " or ".join(
+                f"{key!r} not in x" for key in schema["required"]
+            )
+            lines.append(f"if {conditions}:")
+            lines.append("    return False")
+        if "propertyNames" in keywords:
+            function = self.function(_join(pointer, "propertyNames"))
+            lines.append("for k in x:")
+            lines.append(f"    if not {function}(k):")
+            lines.append("        return False")
+        properties = (
+            schema.get("properties", {}) if "properties" in keywords else {}
+        )
+        patterns = (
+            schema.get("patternProperties", {})
+            if "patternProperties" in keywords
+            else {}
+        )
+        additional = (
+            schema.get("additionalProperties", True)
+            if "additionalProperties" in keywords
+            else True
+        )
+        if not (properties or patterns or additional is not True):
+            return lines
+        property_functions = self.constant(
+            "{"
+            + ", ".join(
+                f"{key!r}: " + self.function(_join(pointer, "properties", key))
+                for key in properties
+            )
+            + "}"
+        )
+        lines.append("for k, v in x.items():")
+        lines.append(f"    f = {property_functions}.get(k)")
+        if not patterns:
+            lines.append("    if f is not None:")
+            lines.append("        if not f(v):")
+            lines.append("            return False")
+            if additional is not True:
+                lines.append("    else:")
+                lines.extend(
+                    f"        {line}"
+                    for line in self.additional(additional, pointer)
+                )
+            return lines
+        pattern_functions = self.constant(
+            "("
+            + "".join(
+                f"(re.compile({pattern!r}), "
+                + self.function(_join(pointer, "patternProperties", pattern))
+                + "), "
+                for pattern in patterns
+            )
+            + ")"
+        )
+        lines.append("    matched = f is not None")
+        lines.append("    if matched and not f(v):")
+        lines.append("        return False")
+        lines.append(f"    for regex, g in {pattern_functions}:")
+        lines.append("        if regex.search(k):")
+        lines.append("            matched = True")
+        lines.append("            if not g(v):")
+        lines.append("                return False")
+        if additional is not True:
+            lines.append("    if not matched:")
+            lines.extend(
+                f"        {line}"
+                for line in self.additional(additional, pointer)
+            )
+        return lines
+
+    def additional(self, additional, pointer) -> list[str]:
+        if additional is False:
+            return ["return False"]
+        function = self.function(_join(pointer, "additionalProperties"))
+        return [f"if not {function}(v):", "    return False"]
+
+    def conditional(self, schema, keywords, pointer) -> list[str]:
+        lines = [f"if {self.function(_join(pointer, 'if'))}(x):"]
+        branches = []
+        for keyword in ("then", "else"):
+            # Both are evaluated as part of the if keyword
+            if keyword in schema:
+                function = self.function(_join(pointer, keyword))
+                branches.append([f"if not {function}(x):", "    return False"])
+            else:
+                branches.append(["pass"])
+        lines.extend(f"    {line}" for line in branches[0])
+        lines.append("else:")
+        lines.extend(f"    {line}" for line in branches[1])
+        return lines
+
+    def calls(self, subschemas, pointer, keyword) -> list[str]:
+        if not isinstance(subschemas, list) or not subschemas:
+            raise _Unsupported(f"{keyword} {subschemas!r}")
+        return [
+            f"{self.function(_join(pointer, keyword, i))}(x)"
+            for i in range(len(subschemas))
+        ]
+
+    def membership(self, values) -> list[str]:
+        if not all(
+            value is None or isinstance(value, str) for value in values
+        ):
+            raise _Unsupported("enum or const with non-string values")
+        strings = sorted(value for value in values if value is not None)
+        name = self.constant(f"frozenset({tuple(strings)!r})")
+        condition = f"isinstance(x, str) and x in {name}"
+        if None in values:
+            condition = f"x is None or {condition}"
+        return [f"if not ({condition}):", "    return False"]
+
+
+class _Unsupported(Exception):
+    pass
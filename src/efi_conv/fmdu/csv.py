@@ -1,11 +1,12 @@
 import csv
 import logging
-import pathlib
 import re
 
 from avefi_schema import model_pydantic_v2 as efi
 
-from ..core.utils import described_by_issuer
+from ..core import diagnostics
+from ..core.dates import is_valid_date
+from ..core.utils import described_by_issuer, open_file
 
 log = logging.getLogger(__name__)
 FILE_ENCODING = "iso8859-1"
@@ -39,7 +40,7 @@ def efi_import(input_file) -> list[efi.MovingImageRecord]:
 
 
 def read_input(input_file) -> list[csv.DictReader]:
-    with pathlib.Path(input_file).open(encoding=FILE_ENCODING) as f:
+    with open_file(input_file, "r", encoding=FILE_ENCODING) as f:
         parsed_input = list(
             csv.DictReader(f, delimiter=DELIMITER, fieldnames=FIELD_NAMES)
         )
@@ -98,19 +99,32 @@ def map_to_efi(
                 normalised = ", ".join(reversed(components))
                 name_count = len(name.split())
                 if name_count > 2:
-                    log.warning(
-                        f"Replaced name for director '{name}' by"
-                        f" '{normalised}'"
+                    diagnostics.warning(
+                        log,
+                        "replaced_director_name",
+                        "Replaced name for director '{}' by '{}'",
+                        name,
+                        normalised,
                     )
                 elif name_count == 1:
-                    log.warning(f"Unusual name for director: {name}")
+                    diagnostics.warning(
+                        log,
+                        "unusual_director_name",
+                        "Unusual name for director: {}",
+                        name,
+                    )
                 directors.append(
                     efi.Agent(
                         type=efi.AgentTypeEnum("Person"), has_name=normalised
                     )
                 )
             if not any([year, locations, directors]):
-                log.warning(f"No production event for {work_key}")
+                diagnostics.warning(
+                    log,
+                    "no_production_event",
+                    "No production event for {}",
+                    work_key,
+                )
             else:
                 event = efi.ProductionEvent()
                 year = sanitise_year_of_reference(year, source_key)
@@ -238,9 +252,11 @@ def make_title(input_title: str, type_hint: str) -> efi.Title:
                 "has_ordering_name": title_string,
             }
             result = efi.Title(type=title_type, **_title_cache[title_string])
-            log.warning(
-                f"Reconstructed display title, pushing article to front:"
-                f" {result.has_name}"
+            diagnostics.warning(
+                log,
+                "article_pushed_to_front",
+                "Reconstructed display title, pushing article to front: {}",
+                result.has_name,
             )
         else:
             result = efi.Title(type=title_type, has_name=title_string)
@@ -287,13 +303,7 @@ def sanitise_year_of_reference(date_string, source_key):
                 result,
             )
             result = re.sub(r"^(\d{4,4}\D?)-(\d{4,4}\D?)$", "\\1/\\2", result)
-    if not re.search(
-        r"^-?([1-9][0-9]{3,}|0[0-9]{3})(-(0[1-9]|1[0-2])"
-        r"(-(0[1-9]|[12][0-9]|3[01]))?)?[?~]?"
-        r"(/-?([1-9][0-9]{3,}|0[0-9]{3})"
-        r"(-(0[1-9]|1[0-2])(-(0[1-9]|[12][0-9]|3[01]))?)?[?~]?)?$",
-        result,
-    ):
+    if not is_valid_date(result):
         raise ValueError(f"Invalid date string: {date_string}")
     return result
 
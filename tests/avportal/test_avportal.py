@@ -1,3 +1,4 @@
+import gzip
 import json
 
 from efi_conv.avportal import avportal
@@ -17,3 +18,11 @@ def test_schema_compliance(input_path):
     assert check.pass_checks(efi_records, schema_validator), (
         "Mapped data did not validate"
     )
+
+
+def test_compressed_input(input_path, tmp_path):
+    input_file = input_path("clip27540.xml")
+    compressed_file = tmp_path / "clip27540.xml.gz"
+    compressed_file.write_bytes(gzip.compress(input_file.read_bytes()))
+    expected = avportal.read_input(input_file)
+    assert avportal.read_input(compressed_file) == expected
@@ -0,0 +1,131 @@
+import io
+import json
+
+import pytest
+
+from efi_conv.core import avefi, utils
+
+
+def test_iter_load(input_path):
+    sample_file = input_path("data_analytic_works.json")
+    assert list(avefi.iter_load(sample_file)) == avefi.load(sample_file)
+
+
+def test_iter_load_decoded(input_path):
+    sample_file = input_path("data_analytic_works.json")
+    batches = list(avefi.iter_load_decoded(sample_file, 3))
+    assert [len(batch.records) for batch in batches] == [3, 3, 1]
+    expected = avefi.load_decoded(sample_file)
+    for i, field in enumerate(expected):
+        assert [x for batch in batches for x in batch[i]] == field
+
+
+def test_iter_loads_small_chunks(input_path):
+    sample_file = input_path("data_analytic_works.json")
+    with sample_file.open("rb") as f:
+        raw_records = list(avefi.iter_raw_records(f.read, chunk_size=7))
+    with sample_file.open() as f:
+        expected = json.load(f)
+    assert [json.loads(raw) for raw in raw_records] == expected
+
+
+def test_iter_loads_single_record(input_path):
+    efi_records = avefi.load(input_path("data_analytic_works.json"))
+    serialized = efi_records[0].model_dump_json(exclude_none=True)
+    assert list(avefi.iter_loads(serialized)) == efi_records[:1]
+
+
+@pytest.mark.parametrize(
+    "input",
+    [
+        "[{}, , {}]",
+        "[{} {}]",
+        "[{},]",
+        "[[]]",
+        "[{}",
+        "[{}] x",
+        "[{}][{}]",
+        "[{}] {}",
+        "{} [{}]",
+        "[] []",
+    ],
+)
+def test_iter_loads_malformed(input):
+    with pytest.raises(ValueError):
+        list(avefi.iter_raw_records(io.BytesIO(input.encode()).read))
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_writer(input_path, tmp_path, indent):
+    efi_records = avefi.load(input_path("data_analytic_works.json"))
+    output = tmp_path / "efi_records.json"
+    with avefi.AvefiWriter(output, indent=indent) as writer:
+        for record in efi_records:
+            writer.write(record)
+    assert writer.count == len(efi_records)
+    assert output.read_text() == avefi.dumps(efi_records, indent=indent)
+
+
+def test_jsonl_roundtrip(input_path, tmp_path):
+    efi_records = avefi.load(input_path("data_analytic_works.json"))
+    output = tmp_path / "efi_records.jsonl"
+    avefi.dump(efi_records, output)
+    lines = output.read_text().splitlines()
+    assert len(lines) == len(efi_records)
+    assert avefi.load(output) == efi_records
+    assert list(avefi.iter_load(output)) == efi_records
+
+
+@pytest.mark.parametrize("suffix", [".json.gz", ".jsonl.xz", ".json.bz2"])
+def test_compressed_roundtrip(input_path, tmp_path, suffix):
+    efi_records = avefi.load(input_path("data_analytic_works.json"))
+    output = tmp_path / f"efi_records{suffix}"
+    avefi.dump(efi_records, output)
+    assert output.read_bytes()[:1] not in (b"[", b"{")
+    assert avefi.load(output) == efi_records
+    assert list(avefi.iter_load(output)) == efi_records
+
+
+def test_loads_container_formats(input_path):
+    efi_records = avefi.load(input_path("data_analytic_works.json"))
+    assert avefi.loads(avefi.dumps(efi_records[:1])) == efi_records[:1]
+    assert avefi.loads(avefi.dumps(efi_records, jsonl=True)) == efi_records
+    single_record = efi_records[0].model_dump_json(exclude_none=True)
+    assert avefi.loads(f"  {single_record}".encode()) == efi_records[:1]
+    assert avefi.loads("") == []
+
+
+def test_sharded_writer(input_path, tmp_path):
+    efi_records = avefi.load(input_path("data_analytic_works.json"))
+    with avefi.ShardedWriter(tmp_path / "out.json.gz", 3) as writer:
+        writer.write_all(efi_records)
+    with (tmp_path / "out.manifest.json").open() as f:
+        manifest = json.load(f)
+    assert manifest["records"] == len(efi_records)
+    assert [shard["records"] for shard in manifest["shards"]] == [3, 3, 1]
+    loaded_records = []
+    for shard in manifest["shards"]:
+        shard_file = tmp_path / shard["file"]
+        assert shard["sha256"] == utils.file_digest(shard_file)
+        loaded_records.extend(avefi.load(shard_file))
+    assert loaded_records == efi_records
+
+
+@pytest.mark.parametrize("suffix", [".json", ".jsonl", ".json.gz"])
+@pytest.mark.parametrize("keep", [{1, 2, 4}, {0, 6}, {5}, set()])
+def test_filter_file(input_path, tmp_path, suffix, keep):
+    efi_records = avefi.load(input_path("data_analytic_works.json"))
+    efi_file = tmp_path / f"efi_records{suffix}"
+    avefi.dump(efi_records, efi_file)
+    avefi.filter_file(efi_file, keep)
+    expected = [rec for i, rec in enumerate(efi_records) if i in keep]
+    assert avefi.load(efi_file) == expected
+    # Given the uniform formatting of the input, output must not
+    # differ from a fresh dump
+    expected_file = tmp_path / f"expected{suffix}"
+    avefi.dump(expected, expected_file)
+    with (
+        utils.open_file(efi_file) as f,
+        utils.open_file(expected_file) as f_expected,
+    ):
+        assert f.read() == f_expected.read()
@@ -0,0 +1,152 @@
+"""Performance measurements on large synthetic input.
+
+These tests are deselected by default. Run them with::
+
+    pytest -m benchmark -s
+
+The size of the generated AVefi file can be adjusted by means of the
+EFI_CONV_BENCHMARK_SIZE environment variable (in bytes). The record
+counts used to measure how pass_checks scales can be set as a comma
+separated list in EFI_CONV_BENCHMARK_RECORDS.
+
+"""
+
+import os
+import time
+
+from avefi_schema import model_pydantic_v2 as efi
+from jsonschema import Draft202012Validator
+import pytest
+
+from efi_conv.core import avefi, check
+
+pytestmark = pytest.mark.benchmark
+BENCHMARK_SIZE = int(os.environ.get("EFI_CONV_BENCHMARK_SIZE", 1 << 30))
+BENCHMARK_RECORDS = [
+    int(n)
+    for n in os.environ.get(
+        "EFI_CONV_BENCHMARK_RECORDS", "10000,100000,1000000"
+    ).split(",")
+]
+# Every INVALID_EVERY-th copy of the templates gets an invalid work
+INVALID_EVERY = 10
+
+
+@pytest.fixture(scope="module")
+def templates(request):
+    sample_file = request.path.parent / "data_analytic_works.json"
+    return [rec.model_dump() for rec in avefi.load(sample_file)]
+
+
+def replicate(templates, copy_no, invalid=False):
+    """Return a copy of templates with all identifiers made unique.
+
+    Identifiers are suffixed with ``copy_no`` wherever they occur,
+    i.e. references between the copied records are retained.
+
+    """
+
+    def suffix_ids(data):
+        if isinstance(data, dict):
+            if data.get("category") in (
+                "avefi:LocalResource",
+                "avefi:AVefiResource",
+            ):
+                return {**data, "id": f"{data['id']}_{copy_no}"}
+            return {key: suffix_ids(value) for key, value in data.items()}
+        if isinstance(data, list):
+            return [suffix_ids(value) for value in data]
+        return data
+
+    records = []
+    for template in templates:
+        record = suffix_ids(template)
+        if (
+            invalid
+            and record["category"] == "avefi:WorkVariant"
+            and record["type"] != "Analytic"
+        ):
+            record["has_event"][0]["has_date"] = "1976/1975"
+        records.append(
+            efi.MovingImageRecordTypeAdapter.validate_python(record)
+        )
+    return records
+
+
+@pytest.fixture(scope="module")
+def large_export(templates, tmp_path_factory):
+    output = tmp_path_factory.mktemp("benchmark") / "efi_records.json"
+    copy_size = len(avefi.dumps(replicate(templates, 0), indent=2))
+    copies = BENCHMARK_SIZE // copy_size + 1
+    with avefi.AvefiWriter(output) as writer:
+        for copy_no in range(copies):
+            writer.write_all(replicate(templates, copy_no))
+    return output
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def test_load_bytes(large_export):
+    size_mb = large_export.stat().st_size / (1 << 20)
+    records_str, seconds_str = timed(
+        lambda path: avefi.loads(path.read_text()), large_export
+    )
+    del records_str
+    records_bytes, seconds_bytes = timed(avefi.load, large_export)
+    print(
+        f"\nLoading {size_mb:.0f} MB: {seconds_str:.2f}s via str,"
+        f" {seconds_bytes:.2f}s via bytes"
+    )
+    assert records_bytes
+
+
+def test_pass_checks_scaling(templates):
+    # Schema validation is not what we are after here
+    schema_validator = Draft202012Validator({})
+    per_record = []
+    for size in BENCHMARK_RECORDS:
+        efi_records = []
+        for copy_no in range(size // len(templates) + 1):
+            efi_records.extend(
+                replicate(
+                    templates, copy_no, invalid=copy_no % INVALID_EVERY == 0
+                )
+            )
+        del efi_records[size:]
+        _, seconds = timed(
+            check.pass_checks, efi_records, schema_validator, True
+        )
+        per_record.append(seconds / size)
+        print(
+            f"\npass_checks on {size} records: {seconds:.2f}s,"
+            f" {len(efi_records)} records left"
+        )
+    # Removal must not become more expensive per record as the list
+    # grows, allowing for some noise.
+    assert max(per_record) < 3 * min(per_record)
+
+
+def test_compiled_validation(templates):
+    compiled = check.get_schema_validator()
+    instances = []
+    for copy_no in range(BENCHMARK_RECORDS[0] // len(templates) + 1):
+        instances.extend(
+            rec.model_dump() for rec in replicate(templates, copy_no)
+        )
+
+    def validate_all(schema_validator):
+        return sum(schema_validator.is_valid(x) for x in instances)
+
+    valid, seconds_interpreted = timed(validate_all, compiled.validator)
+    valid_compiled, seconds_compiled = timed(validate_all, compiled)
+    print(
+        f"\nValidating {len(instances)} records: {seconds_interpreted:.2f}s"
+        f" interpreted, {seconds_compiled:.2f}s compiled"
+        f" ({seconds_interpreted / seconds_compiled:.0f}x faster)"
+    )
+    assert valid_compiled == valid
+    assert seconds_compiled * 2 < seconds_interpreted
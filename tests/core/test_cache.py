@@ -0,0 +1,161 @@
+import inspect
+import os
+import pickle
+import time
+
+import pytest
+
+from efi_conv.core import avefi, cache, rules
+
+
+@pytest.fixture
+def result_cache_file(tmp_path, monkeypatch):
+    cache_file = tmp_path / "results.sqlite"
+    monkeypatch.setattr(cache, "RESULT_CACHE_FILE", cache_file)
+    return cache_file
+
+
+@pytest.fixture
+def record_cache_dir(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "records"
+    monkeypatch.setattr(cache, "RECORD_CACHE_DIR", cache_dir)
+    return cache_dir
+
+
+def test_load_records(input_path, record_cache_dir, monkeypatch):
+    sample_file = input_path("data_analytic_works.json")
+    efi_records = cache.load_records(sample_file, "v1")
+    assert efi_records == avefi.load(sample_file)
+    assert len(list(record_cache_dir.iterdir())) == 1
+
+    # Second run must not touch the JSON parser
+    def fail(source):
+        raise AssertionError("Records have not been loaded from cache")
+
+    monkeypatch.setattr(avefi, "decode_records", fail)
+    assert cache.load_records(sample_file, "v1") == efi_records
+    with pytest.raises(AssertionError):
+        cache.load_records(sample_file, "v2")
+
+
+def test_load_decoded(input_path, record_cache_dir):
+    sample_file = input_path("data_analytic_works.json")
+    expected = avefi.load_decoded(sample_file)
+    assert cache.load_decoded(sample_file, "v1") == expected
+    decoded = cache.load_decoded(sample_file, "v1")
+    assert decoded.records == expected.records
+    assert decoded.digests == expected.digests
+    assert list(decoded.instances) == expected.instances
+    assert decoded.instances[1:3] == expected.instances[1:3]
+    assert cache.load_records(sample_file, "v1") == expected.records
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        b"",
+        b"garbage",
+        b"cno_such_module\nRecord\n.",
+        pickle.dumps(["not", "an", "entry", "at all"]),
+    ],
+)
+def test_load_decoded_unusable(input_path, record_cache_dir, caplog, content):
+    sample_file = input_path("data_analytic_works.json")
+    expected = avefi.load_decoded(sample_file)
+    cache.load_decoded(sample_file, "v1")
+    (cache_file,) = record_cache_dir.iterdir()
+    cache_file.write_bytes(content)
+    assert cache.load_decoded(sample_file, "v1") == expected
+    assert "Ignoring unusable cache file" in caplog.text
+    assert cache.load_decoded(sample_file, "v1").records == expected.records
+
+
+def test_evict(tmp_path):
+    for i in range(5):
+        (tmp_path / f"{i}.pickle").write_bytes(b"x" * 100)
+    fresh, stale = tmp_path / "fresh.tmp", tmp_path / "stale.tmp"
+    fresh.write_bytes(b"x" * 100)
+    stale.write_bytes(b"x" * 100)
+    mtime = time.time() - cache.STALE_TMP_AGE - 1
+    os.utime(stale, (mtime, mtime))
+    cache.evict(tmp_path, 250)
+    assert len(list(tmp_path.glob("*.pickle"))) == 2
+    assert fresh.exists()
+    assert not stale.exists()
+
+
+def test_load_decoded_failure(input_path, record_cache_dir, monkeypatch):
+    def fail(*args, **kwargs):
+        raise pickle.PicklingError("Cannot pickle")
+
+    monkeypatch.setattr(pickle, "dump", fail)
+    with pytest.raises(pickle.PicklingError):
+        cache.load_decoded(input_path("data_analytic_works.json"), "v1")
+    assert list(record_cache_dir.iterdir()) == []
+
+
+def test_package_version():
+    assert cache.package_version("efi_conv") != "unknown"
+    assert cache.package_version("no-such-package") == "unknown"
+
+
+def test_result_cache(result_cache_file, monkeypatch):
+    violation = rules.Violation("event_date", "Invalid date")
+    with cache.ResultCache("v1") as result_cache:
+        result_cache.put([(b"a", []), (b"b", [violation])])
+    with cache.ResultCache("v1") as result_cache:
+        assert result_cache.get([b"b", b"c", b"a"]) == [
+            [violation],
+            None,
+            [],
+        ]
+    monkeypatch.setattr(cache, "RESULT_CACHE_BATCH_SIZE", 1)
+    monkeypatch.setattr(cache.settings, "line_limit", 10)
+    with cache.ResultCache("v1") as result_cache:
+        assert result_cache.get([b"a", b"b"]) == [None, None]
+
+
+def test_result_cache_version(result_cache_file, monkeypatch, tmp_path):
+    def version():
+        with cache.ResultCache("v1") as result_cache:
+            return result_cache.version
+
+    original = version()
+    # Settings unrelated to rules leave entries alone
+    monkeypatch.setattr(cache.settings, "diagnostic_examples", 1)
+    monkeypatch.setattr(cache.settings, "record_cache_size", 1)
+    assert version() == original
+    text_limit = cache.settings.text_limit
+    monkeypatch.setattr(cache.settings, "text_limit", 10)
+    assert version() != original
+    monkeypatch.setattr(cache.settings, "text_limit", text_limit)
+    assert version() == original
+
+    # Changes of the rules count even without bumping any version
+    checks = {r.check for r in rules.registered_rules()}
+    rules_file = tmp_path / "rules.py"
+    rules_file.write_text(f"{inspect.getsource(rules)}\n# Changed\n")
+    monkeypatch.setattr(
+        inspect,
+        "getsourcefile",
+        lambda obj: str(rules_file) if obj in checks else None,
+    )
+    assert version() != original
+
+
+def test_result_cache_prune(result_cache_file):
+    violation = rules.Violation("event_date", "Invalid date")
+    for version in ("v1", "v2"):
+        with cache.ResultCache(version) as result_cache:
+            result_cache.put([(b"a", [violation])])
+    # Alternating setups keep their entries
+    for version in ("v1", "v2"):
+        with cache.ResultCache(version) as result_cache:
+            assert result_cache.get([b"a"]) == [[violation]]
+    with cache.ResultCache("v1") as result_cache:
+        result_cache.prune(3600)
+        assert result_cache.get([b"a"]) == [[violation]]
+        result_cache.prune()
+        assert result_cache.get([b"a"]) == [[violation]]
+    with cache.ResultCache("v2") as result_cache:
+        assert result_cache.get([b"a"]) == [None]
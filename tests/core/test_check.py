@@ -1,4 +1,13 @@
-from efi_conv.core import avefi, check
+import functools
+import json
+
+from avefi_schema import model_pydantic_v2 as efi
+from jsonschema import Draft202012Validator
+from jsonschema.exceptions import ValidationError
+import pytest
+
+from efi_conv.core import avefi, check, diagnostics, rules
+from efi_conv.core.profiling import Profile
 
 
 def test_analytic_work(input_path):
@@ -75,3 +84,328 @@ def test_equal_period(input_path):
             [equal_record], schema_validator, remove_invalid=False
         )
         assert result, "Expected validation to pass for equal period"
+
+
+def series_hierarchy(templates, depth):
+    """Return a work with analytic works nested ``depth`` levels deep."""
+    work, analytic_work = templates[:2]
+    records = [work.model_copy(deep=True)]
+    records[0].has_identifier = records[0].has_identifier[:1]
+    parent_id = records[0].has_identifier[0]
+    for level in range(depth):
+        rec = analytic_work.model_copy(deep=True)
+        rec.has_identifier[0].id = f"level_{level}"
+        rec.is_part_of = [parent_id.model_copy()]
+        parent_id = rec.has_identifier[0]
+        records.append(rec)
+    return records
+
+
+def test_purge_deep_hierarchy(input_path):
+    schema_validator = check.get_schema_validator()
+    templates = avefi.load(input_path("data_analytic_works.json"))
+    efi_records = series_hierarchy(templates, 2000)
+    efi_records[0].has_event[0].has_date = "1976/1975"
+    result = check.pass_checks(
+        efi_records, schema_validator, remove_invalid=True
+    )
+    assert not result
+    assert efi_records == []
+
+
+def test_dangling_deep_hierarchy(input_path):
+    schema_validator = check.get_schema_validator()
+    templates = avefi.load(input_path("data_analytic_works.json"))
+    efi_records = series_hierarchy(templates, 2000)
+    result = check.pass_checks(
+        efi_records, schema_validator, remove_invalid=True
+    )
+    assert not result
+    assert efi_records == []
+
+
+def test_reference_cycle(input_path):
+    schema_validator = check.get_schema_validator()
+    efi_records = avefi.load(input_path("data_analytic_works.json"))
+    manifestation = next(
+        rec for rec in efi_records if rec.category == "avefi:Manifestation"
+    )
+    manifestation.has_identifier = manifestation.has_identifier[:1]
+    manifestation.same_as = [manifestation.has_identifier[0].model_copy()]
+    manifestation.is_manifestation_of[0].id = "missing"
+    result = check.pass_checks(
+        efi_records, schema_validator, remove_invalid=True
+    )
+    assert not result
+    assert [rec.category for rec in efi_records] == ["avefi:WorkVariant"]
+
+
+def test_identifier_table():
+    table = check.IdentifierTable()
+    local = efi.LocalResource(id="200011016")
+    key = table.key(local)
+    assert table.key(efi.LocalResource(id="200011016")) == key
+    assert table.key(efi.AVefiResource(id="200011016")) != key
+    assert len(table) == 2
+    assert table.name(key) == "avefi:LocalResource.200011016"
+
+
+def test_parallel_validation(input_path):
+    # Reject records with a particular identifier only
+    schema = {
+        "properties": {
+            "has_identifier": {
+                "not": {"contains": {"properties": {"id": {"const": "x"}}}}
+            }
+        }
+    }
+    schema_validator = Draft202012Validator(schema)
+    templates = avefi.load(input_path("data_analytic_works.json"))
+    efi_records = []
+    for copy_no in range(300):
+        for template in templates:
+            rec = template.model_copy(deep=True)
+            for identifier in rec.has_identifier:
+                identifier.id = f"{identifier.id}_{copy_no}"
+            efi_records.append(rec)
+    for pos in (1500, 1800):
+        efi_records[pos].has_identifier[0].id = "x"
+    with pytest.raises(ValidationError) as serial:
+        check.pass_checks(efi_records, schema_validator)
+    with (
+        check.validation_pool(schema_validator, 2) as executor,
+        pytest.raises(ValidationError) as parallel,
+    ):
+        check.pass_checks(efi_records, schema_validator, executor=executor)
+    assert parallel.value.instance == serial.value.instance
+    assert parallel.value.instance[0]["id"] == "x"
+    assert str(parallel.value) == str(serial.value)
+
+
+def test_validate_decoded(input_path):
+    # Reject records with an excessively long identifier
+    schema = {
+        "properties": {
+            "has_identifier": {
+                "items": {"properties": {"id": {"maxLength": 100}}}
+            }
+        }
+    }
+    schema_validator = Draft202012Validator(schema)
+    sample_file = input_path("data_analytic_works.json")
+    instances, efi_records, _ = avefi.load_decoded(sample_file)
+    assert check.pass_checks(
+        efi_records, schema_validator, instances=instances
+    )
+    # Only the decoded JSON gets validated
+    instances[3]["has_identifier"][0]["id"] = "x" * 101
+    with pytest.raises(ValidationError) as excinfo:
+        check.pass_checks(efi_records, schema_validator, instances=instances)
+    assert excinfo.value.instance == "x" * 101
+    with (
+        check.validation_pool(schema_validator, 2) as executor,
+        pytest.raises(ValidationError),
+    ):
+        check.pass_checks(
+            efi_records,
+            schema_validator,
+            executor=executor,
+            instances=instances,
+        )
+
+
+def test_known_violations(input_path):
+    schema_validator = Draft202012Validator({"required": ["nonexistent"]})
+    efi_records = avefi.load(input_path("data_analytic_works.json"))
+    # Records with known results are not validated nor checked again
+    violations = [[] for _ in efi_records]
+    assert check.pass_checks(
+        efi_records, schema_validator, violations=violations
+    )
+    work = efi_records[0]
+    work.has_event[0].has_date = "1976/1975"
+    violations[0] = None
+    with pytest.raises(ValidationError):
+        check.pass_checks(efi_records, schema_validator, violations=violations)
+    schema_validator = Draft202012Validator({})
+    assert not check.pass_checks(
+        efi_records, schema_validator, violations=violations
+    )
+    assert [v.rule for v in violations[0]] == ["event_date"]
+    # Known violations count, even if the record is fine by now
+    work.has_event[0].has_date = "1975/1976"
+    assert not check.pass_checks(
+        efi_records, schema_validator, violations=violations
+    )
+
+
+def test_check_globally(input_path, tmp_path):
+    schema_validator = Draft202012Validator({})
+    with input_path("data_analytic_works.json").open() as f:
+        records = json.load(f)
+    works, others = tmp_path / "works.json", tmp_path / "others.json"
+    works.write_text(json.dumps(records[:5]))
+    others.write_text(json.dumps(records[5:]))
+    check_file = functools.partial(
+        check.load_and_check, schema_validator=schema_validator
+    )
+    # Manifestation and item on their own are fine in global mode only
+    graph = check.ReferenceGraph()
+    assert check.load_and_check(others, graph, schema_validator) == (
+        True,
+        2,
+    )
+    assert not check.check_references(graph, remove_invalid=True)
+    assert check.check_globally([works, others], check_file)
+
+    # Removals cascade from one file to the other
+    records[0]["has_event"][0]["has_date"] = "1976/1975"
+    works.write_text(json.dumps(records[:5]))
+    assert not check.check_globally(
+        [works, others], check_file, remove_invalid=True
+    )
+    assert avefi.load(works) == []
+    assert avefi.load(others) == []
+
+
+def test_check_in_batches(input_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(check, "CHECK_BATCH_SIZE", 2)
+    schema_validator = Draft202012Validator({})
+    with input_path("data_analytic_works.json").open() as f:
+        records = json.load(f)
+    records[5]["has_event"] = [{"has_date": "19xx"}]
+    sample_file = tmp_path / "sample.json"
+    sample_file.write_text(json.dumps(records))
+    efi_records = avefi.load(sample_file)
+    assert not check.pass_checks(
+        efi_records, schema_validator, remove_invalid=True
+    )
+
+    graph = check.ReferenceGraph()
+    assert check.load_and_check(sample_file, graph, schema_validator) == (
+        False,
+        7,
+    )
+    assert not check.check_references(graph, remove_invalid=True)
+    check.remove_records(sample_file, 7, graph.removed, remove_invalid=True)
+    assert avefi.load(sample_file) == efi_records
+
+
+def test_check_in_batches_with_pool(input_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(check, "VALIDATION_CHUNK_SIZE", 1)
+    schema = {
+        "properties": {
+            "has_identifier": {
+                "not": {"contains": {"properties": {"id": {"const": "x"}}}}
+            }
+        }
+    }
+    schema_validator = Draft202012Validator(schema)
+    with input_path("data_analytic_works.json").open() as f:
+        records = json.load(f)
+    records[3]["has_event"] = [{"has_date": "19xx"}]
+    sample_file = tmp_path / "sample.json"
+    sample_file.write_text(json.dumps(records))
+    serial_graph = check.ReferenceGraph()
+    serial = check.load_and_check(
+        sample_file, serial_graph, schema_validator, batch_size=2
+    )
+    with check.validation_pool(schema_validator, 2) as executor:
+        graph = check.ReferenceGraph()
+        assert (
+            check.load_and_check(
+                sample_file,
+                graph,
+                schema_validator,
+                executor=executor,
+                batch_size=2,
+            )
+            == serial
+            == (False, 7)
+        )
+        assert graph.removed == serial_graph.removed
+
+        records[5]["has_identifier"][0]["id"] = "x"
+        sample_file.write_text(json.dumps(records))
+        with pytest.raises(ValidationError) as e:
+            check.load_and_check(
+                sample_file,
+                check.ReferenceGraph(),
+                schema_validator,
+                executor=executor,
+                batch_size=2,
+            )
+        assert e.value.instance[0]["id"] == "x"
+
+
+def test_check_profile(input_path, tmp_path):
+    schema_validator = Draft202012Validator({})
+    sample_file = tmp_path / "sample.json"
+    sample_file.write_text(input_path("data_analytic_works.json").read_text())
+    profile = Profile()
+    graph = check.ReferenceGraph()
+    assert check.load_and_check(
+        sample_file, graph, schema_validator, profile=profile
+    ) == (True, 7)
+    assert check.check_references(graph, profile=profile)
+    assert list(profile.phases) == [
+        "load",
+        "schema validation",
+        "rules",
+        "reference graph",
+        "unresolved references",
+        "dangling records",
+    ]
+    assert profile.phases["load"].records == 7
+    assert profile.phases["rules"].records == 7
+
+
+def test_check_in_parallel(input_path, tmp_path):
+    schema_validator = Draft202012Validator({})
+    with input_path("data_analytic_works.json").open() as f:
+        records = json.load(f)
+    efi_files = [tmp_path / f"shard_{i}.json" for i in range(4)]
+    for efi_file in efi_files:
+        efi_file.write_text(json.dumps(records))
+    records[0]["has_event"][0]["has_date"] = "1976/1975"
+    efi_files[2].write_text(json.dumps(records))
+    valid_records = avefi.load(efi_files[0])
+
+    diagnostics.reset()
+    assert not check.check_in_parallel(efi_files, 2, schema_validator)
+    (violation,) = diagnostics.collected()
+    assert (violation.kind, violation.count) == ("event_date", 1)
+    assert len(avefi.load(efi_files[2])) == 7
+
+    profile = Profile()
+    rules.reset_stats()
+    assert not check.check_in_parallel(
+        efi_files, 2, schema_validator, remove_invalid=True, profile=profile
+    )
+    assert profile.phases["load"].records == 28
+    (event_date,) = [
+        r for r in rules.registered_rules() if r.name == "event_date"
+    ]
+    assert (event_date.calls, event_date.hits) == (24, 1)
+    for efi_file in efi_files:
+        expected = [] if efi_file == efi_files[2] else valid_records
+        assert avefi.load(efi_file) == expected
+    assert check.check_in_parallel(efi_files, 2, schema_validator)
+
+    # Results of files already being checked when the first one fails
+    # are not lost
+    for efi_file in efi_files[1:3]:
+        efi_file.write_text(json.dumps(records))
+    diagnostics.reset()
+    assert not check.check_in_parallel(efi_files, 2, schema_validator)
+    (violation,) = diagnostics.collected()
+    assert (violation.kind, violation.count) == ("event_date", 2)
+    diagnostics.reset()
+
+
+@pytest.mark.parametrize("jobs", [1, 2, 3, 4, 8, 64])
+def test_check_batch_size(jobs):
+    batch_size = check.check_batch_size(jobs)
+    assert batch_size >= check.CHECK_BATCH_SIZE
+    if jobs > 1:
+        assert batch_size % (jobs * check.VALIDATION_CHUNK_SIZE) == 0
@@ -0,0 +1,46 @@
+import pytest
+
+from efi_conv.core.dates import Date, Period, is_valid_date, parse_date
+
+
+@pytest.mark.parametrize(
+    "date_str,expected",
+    [
+        ("1975", Period(Date(1975), Date(1975))),
+        ("1975-05-01~", Period(Date(1975, 5, 1, "~"), Date(1975, 5, 1, "~"))),
+        ("1972/1973-06?", Period(Date(1972), Date(1973, 6, None, "?"))),
+        ("-0044-03-15", Period(Date(-44, 3, 15), Date(-44, 3, 15))),
+        ("1975-13", None),
+        ("1975-05-32", None),
+        ("75", None),
+        ("1975/", None),
+        ("1975/1976/1977", None),
+        ("ca. 1975", None),
+    ],
+)
+def test_parse_date(date_str, expected):
+    assert parse_date(date_str) == expected
+    assert is_valid_date(date_str) == (expected is not None)
+
+
+@pytest.mark.parametrize(
+    "date_str,is_ordered",
+    [
+        ("1975/1976", True),
+        ("1975/1975", True),
+        ("1976/1975", False),
+        ("1975-05/1975-04-30", False),
+        ("1975?/1975-01~", True),
+        ("-0100/0050", True),
+        ("-0050/-0100", False),
+        ("9999/10000", True),
+    ],
+)
+def test_period_order(date_str, is_ordered):
+    assert parse_date(date_str).is_ordered == is_ordered
+
+
+def test_isoformat():
+    assert Date(-44, 3, 15).isoformat() == "-0044-03-15"
+    assert Date(812, 1).isoformat() == "0812-01"
+    assert Date(12345, None, None, "?").isoformat() == "12345"
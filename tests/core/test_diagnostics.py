@@ -0,0 +1,81 @@
+import logging
+
+import pytest
+
+from efi_conv.core import diagnostics
+from efi_conv.core.settings import settings
+
+log = logging.getLogger(__name__)
+
+
+@pytest.fixture(autouse=True)
+def reset_diagnostics(monkeypatch):
+    monkeypatch.setattr(settings, "diagnostic_examples", 2)
+    diagnostics.reset()
+    yield
+    diagnostics.reset()
+
+
+def test_report(caplog):
+    caplog.set_level(logging.INFO)
+    for i in range(5):
+        diagnostics.info(log, "replaced", "Replaced {} by {}", i, i + 1)
+    diagnostics.error(log, "dangling", "Dangling record {}", "x")
+    assert [r.getMessage() for r in caplog.records] == [
+        "Replaced 0 by 1",
+        "Replaced 1 by 2",
+        "Not logging further messages of kind replaced, see summary",
+        "Dangling record x",
+    ]
+    replaced, dangling = diagnostics.collected()
+    assert (replaced.count, replaced.examples) == (5, [(0, 1), (1, 2)])
+    assert (dangling.count, dangling.level) == (1, logging.ERROR)
+
+
+def test_log_summary(caplog):
+    caplog.set_level(logging.INFO)
+    diagnostics.log_summary()
+    assert not caplog.records
+    for i in range(3):
+        diagnostics.warning(log, "unusual", "Unusual name: {}", i)
+    caplog.clear()
+    diagnostics.log_summary()
+    (record,) = caplog.records
+    assert record.levelno == logging.WARNING
+    lines = record.getMessage().splitlines()
+    assert len(lines) == 3
+    assert lines[2].split() == [
+        "3",
+        "WARNING",
+        "unusual",
+        "Unusual",
+        "name:",
+        "0",
+    ]
+
+
+def test_merge(caplog):
+    caplog.set_level(logging.INFO)
+    collected = []
+    diagnostics.mute()
+    try:
+        for name in "bcd":
+            diagnostics.reset()
+            for _ in range(3):
+                diagnostics.warning(log, "unusual", "Unusual name: {}", name)
+            collected.append(diagnostics.collected())
+    finally:
+        diagnostics.mute(False)
+    assert not caplog.records
+    diagnostics.reset()
+    diagnostics.warning(log, "unusual", "Unusual name: {}", "a")
+    for others in collected:
+        diagnostics.merge(others)
+    (unusual,) = diagnostics.collected()
+    assert unusual.count == 10
+    assert unusual.examples == [("a",), ("b",)]
+    assert [r.getMessage() for r in caplog.records] == [
+        "Unusual name: a",
+        "Unusual name: b",
+        "Not logging further messages of kind unusual, see summary",
+    ]
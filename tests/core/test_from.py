@@ -0,0 +1,33 @@
+import types
+
+from avefi_schema import model_pydantic_v2 as efi
+
+from efi_conv.core import avefi, diagnostics, from_
+from efi_conv.core.utils import described_by_issuer
+
+
+def test_unspecified_source_key(input_path):
+    works = [
+        rec
+        for rec in avefi.load(input_path("data_analytic_works.json"))
+        if isinstance(rec, efi.WorkVariant)
+    ]
+    importer = types.SimpleNamespace(
+        efi_import=lambda input_file: works,
+        ISSUER_INFO={
+            "has_issuer_id": "https://example.org/issuer",
+            "has_issuer_name": "Example",
+        },
+    )
+    diagnostics.reset()
+    assert from_.import_file(importer, "input.xml") == works
+    # Reported once per file rather than once per record
+    (unspecified,) = diagnostics.collected()
+    assert (unspecified.kind, unspecified.count) == (
+        "unspecified_source_key",
+        1,
+    )
+    for rec in works:
+        described_by = described_by_issuer(rec, importer.ISSUER_INFO)
+        assert described_by.has_source_key == [rec.has_identifier[0].id]
+    diagnostics.reset()
@@ -0,0 +1,35 @@
+import json
+import shutil
+
+from efi_conv.core import avefi, index
+
+
+def test_index_lookup(input_path, tmp_path):
+    efi_file = tmp_path / "efi_records.json"
+    shutil.copy(input_path("data_analytic_works.json"), efi_file)
+    with efi_file.open() as f:
+        expected = json.load(f)
+    efi_index = index.build_index(efi_file)
+    assert index.index_file(efi_file).exists()
+    assert index.load_index(efi_file) == efi_index
+
+    for record in expected:
+        for identifier in record["has_identifier"]:
+            spans = index.lookup(
+                efi_index, identifier["id"], category=identifier["category"]
+            )
+            assert spans == index.lookup(efi_index, identifier["id"])
+            raw_record = index.read_record(efi_file, *spans[0])
+            assert json.loads(raw_record) == record
+
+
+def test_outdated_index(input_path, tmp_path):
+    efi_file = tmp_path / "efi_records.jsonl.gz"
+    efi_records = avefi.load(input_path("data_analytic_works.json"))
+    avefi.dump(efi_records, efi_file)
+    old_index = index.load_index(efi_file)
+    avefi.dump(efi_records[:2], efi_file)
+    new_index = index.load_index(efi_file)
+    assert len(new_index) < len(old_index)
+    for span in new_index.values():
+        assert avefi.loads(index.read_record(efi_file, *span))
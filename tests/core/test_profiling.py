@@ -0,0 +1,42 @@
+import json
+import sys
+
+from efi_conv.core.profiling import NULL_PROFILE, Profile
+
+
+def test_profile():
+    profile = Profile()
+    for _ in range(2):
+        with profile.phase("load", 10):
+            pass
+    with profile.phase("rules"):
+        pass
+    profile.count("rules", 5)
+    assert list(profile.phases) == ["load", "rules"]
+    assert profile.phases["load"].records == 20
+    assert profile.phases["rules"].records == 5
+    report = profile.report()
+    assert [phase["name"] for phase in report["phases"]] == ["load", "rules"]
+    assert report["peak_rss"] > 0
+    json.dumps(report)
+    lines = profile.format().splitlines()
+    assert len(lines) == 4
+    assert lines[1].startswith("load")
+    assert lines[-1].startswith("Peak RSS:")
+
+
+def test_null_profile():
+    with NULL_PROFILE.phase("load", 10):
+        pass
+    NULL_PROFILE.count("load", 10)
+    assert NULL_PROFILE.phases == {}
+
+
+def test_peak_rss_without_resource(monkeypatch):
+    # Make the import fail as it does on Windows
+    monkeypatch.setitem(sys.modules, "resource", None)
+    profile = Profile()
+    with profile.phase("load", 1):
+        pass
+    assert profile.report()["peak_rss"] is None
+    assert "Peak RSS" not in profile.format()
@@ -0,0 +1,26 @@
+from avefi_schema import model_pydantic_v2 as efi
+
+from efi_conv.core import avefi, rules
+
+
+def test_check_record(input_path):
+    efi_records = avefi.load(input_path("data_analytic_works.json"))
+    rules.reset_stats()
+    assert [rules.check_record(rec) for rec in efi_records] == [
+        [] for _ in efi_records
+    ]
+    work = efi_records[0]
+    work.has_event[0].has_date = "1976/1975"
+    work.has_event.append(efi.ProductionEvent(has_date="19xx"))
+    work.has_primary_title.type = "TitleProper"
+    violations = rules.check_record(work)
+    assert [v.rule for v in violations] == [
+        "primary_title_type",
+        "event_date",
+        "event_date",
+    ]
+    assert "invalid period: 1976/1975" in violations[1].message
+    stats = {r.name: r for r in rules.registered_rules()}
+    assert stats["event_date"].hits == 2
+    assert stats["primary_title_type"].calls == len(efi_records) + 1
+    assert stats["empty_name"].hits == 0
@@ -0,0 +1,141 @@
+import json
+
+from jsonschema import Draft7Validator, Draft202012Validator
+from jsonschema.exceptions import SchemaError, best_match
+import pytest
+
+from efi_conv.core import validator
+
+SCHEMA = {
+    "$schema": "https://json-schema.org/draft/2020-12/schema",
+    "$defs": {
+        "Name": {"type": ["string", "null"], "pattern": "^[A-Z]"},
+        "Node": {
+            "type": "object",
+            "properties": {
+                "children": {
+                    "type": "array",
+                    "items": {"$ref": "#/$defs/Node"},
+                },
+                "size": {"type": "integer", "minimum": 0},
+            },
+            "additionalProperties": False,
+        },
+    },
+    "type": "object",
+    "required": ["name"],
+    "properties": {
+        "name": {"$ref": "#/$defs/Name", "minLength": 2},
+        "kind": {"enum": ["a", "b", None]},
+        "value": {"oneOf": [{"type": "number"}, {"type": "integer"}]},
+        "tree": {"$ref": "#/$defs/Node"},
+        "tags": {"type": "array", "uniqueItems": True},
+    },
+    "patternProperties": {"^x_": {"type": "string"}},
+    "additionalProperties": {"type": "boolean"},
+}
+INSTANCES = [
+    {"name": "Ab"},
+    {"name": None},
+    {"name": "A"},
+    {"name": "ab"},
+    {},
+    [],
+    {"name": "Ab", "kind": "c"},
+    {"name": "Ab", "kind": None},
+    {"name": "Ab", "value": 1.5},
+    {"name": "Ab", "value": 1},
+    {"name": "Ab", "value": True},
+    {"name": "Ab", "tree": {"children": [{"size": 1}, {"children": []}]}},
+    {"name": "Ab", "tree": {"children": [{"size": -1}]}},
+    {"name": "Ab", "tree": {"children": [{"extra": 1}]}},
+    {"name": "Ab", "tags": [1, 2]},
+    {"name": "Ab", "tags": [1, 1]},
+    {"name": "Ab", "x_note": "text", "flag": True},
+    {"name": "Ab", "x_note": 1},
+    {"name": "Ab", "flag": "yes"},
+]
+
+
+@pytest.fixture(autouse=True)
+def validator_cache_dir(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "validators"
+    monkeypatch.setattr(validator, "VALIDATOR_CACHE_DIR", cache_dir)
+    return cache_dir
+
+
+@pytest.mark.parametrize("instance", INSTANCES)
+def test_compiled_validator(instance):
+    compiled = validator.CompiledValidator(SCHEMA)
+    reference = Draft202012Validator(SCHEMA)
+    assert compiled.is_valid(instance) == reference.is_valid(instance)
+    error = best_match(compiled.iter_errors(instance))
+    expected = best_match(reference.iter_errors(instance))
+    assert str(error) == str(expected)
+
+
+def test_fallback():
+    source = validator.compile_schema(SCHEMA)
+    # uniqueItems is left to jsonschema
+    assert "fallback('/properties/tags')" in source
+
+
+def test_ref_siblings():
+    schema = {
+        "$schema": "http://json-schema.org/draft-07/schema#",
+        "definitions": {"Name": {"type": "string"}},
+        "properties": {"name": {"$ref": "#/definitions/Name", "minLength": 5}},
+    }
+    compiled = validator.CompiledValidator(schema)
+    assert compiled.is_valid({"name": "Ab"})
+    assert Draft7Validator(schema).is_valid({"name": "Ab"})
+
+
+def test_cache(validator_cache_dir, monkeypatch):
+    validator.CompiledValidator(SCHEMA)
+    assert len(list(validator_cache_dir.glob("*.py"))) == 1
+
+    def fail(*args):
+        raise AssertionError("Schema has not been loaded from cache")
+
+    monkeypatch.setattr(validator, "compile_schema", fail)
+    compiled = validator.CompiledValidator(SCHEMA)
+    assert compiled.is_valid({"name": "Ab"})
+
+
+def test_cache_corruption(validator_cache_dir):
+    validator.CompiledValidator(SCHEMA)
+    (path,) = validator_cache_dir.glob("*.py")
+    source = path.read_bytes()
+    # Corrupt code is neither executed nor kept
+    path.write_bytes(source[: len(source) // 2])
+    assert not validator.CompiledValidator(SCHEMA).is_valid({"name": "A"})
+    assert path.read_bytes() == source
+    path.with_suffix(".sha256").unlink()
+    assert not validator.CompiledValidator(SCHEMA).is_valid({"name": "A"})
+    assert path.with_suffix(".sha256").exists()
+
+
+def test_load_validator(tmp_path, monkeypatch):
+    schema_file = tmp_path / "schema.json"
+    schema_file.write_text(json.dumps(SCHEMA))
+    schema_validator = validator.load_validator(schema_file)
+    assert schema_validator.schema == SCHEMA
+
+    # Metaschema check is skipped for the same file content
+    def fail(schema):
+        raise AssertionError("Schema has been checked again")
+
+    monkeypatch.setattr(Draft202012Validator, "check_schema", fail)
+    assert validator.load_validator(schema_file).schema == SCHEMA
+    schema_file.write_text(json.dumps(SCHEMA, indent=2))
+    with pytest.raises(AssertionError):
+        validator.load_validator(schema_file)
+
+
+def test_load_invalid_schema(tmp_path):
+    schema_file = tmp_path / "schema.json"
+    schema_file.write_text(json.dumps({"type": 1}))
+    for _ in range(2):
+        with pytest.raises(SchemaError):
+            validator.load_validator(schema_file)
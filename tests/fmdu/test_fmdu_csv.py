@@ -1,3 +1,4 @@
+import gzip
 import json
 
 from efi_conv.core import avefi, check, from_
@@ -17,3 +18,11 @@ def test_schema_compliance(input_path):
     assert check.pass_checks(efi_records, schema_validator), (
         "Mapped data did not validate"
     )
+
+
+def test_compressed_input(input_path, tmp_path):
+    input_file = input_path("sample_data.csv")
+    compressed_file = tmp_path / "sample_data.csv.gz"
+    compressed_file.write_bytes(gzip.compress(input_file.read_bytes()))
+    expected = fmdu_csv.read_input(input_file)
+    assert fmdu_csv.read_input(compressed_file) == expected